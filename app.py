@@ -2,7 +2,6 @@
 import streamlit as st
 import sys
 import os
-from PIL import Image
 
 # 获取当前文件所在目录
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -110,24 +109,53 @@ def show_main_page():
             )
             
             if uploaded_file:
-                from modules.file_upload import FileUploader
+                from modules.file_upload import FileUploader, UploadSession
                 from modules.file_validator import FileValidator
                 from modules.pdf_converter import PDFConverter
-                from modules.image_processor import ImageProcessor
+                from modules.image_processor import ImageProcessor, ProxyEditor, PAYLOAD_MAX_BYTES
                 
                 file_uploader = FileUploader()
                 file_validator = FileValidator()
                 pdf_converter = PDFConverter()
                 image_processor = ImageProcessor()
                 
-                file_info = file_uploader.save_file(uploaded_file, 1)
+                # 上传处理状态按用户和文件标识保存在会话中，重新运行时不再重复读取、写盘和登记；
+                # 同一用户再次选择内容相同的文件时按内容哈希沿用已有的处理结果（不会沿用其他用户登记的记录）
+                upload_identity = str(getattr(uploaded_file, 'file_id', None) or uploaded_file.name)
+                upload_sessions = st.session_state.setdefault("upload_sessions", {}).setdefault(user['id'], {})
+                upload_session = upload_sessions.get(upload_identity)
+                if upload_session is None:
+                    # 分块读取一遍完成哈希、类型识别、大小检查和写盘
+                    file_info = file_uploader.ingest(uploaded_file, file_validator)
+                    if file_info:
+                        upload_session = next(
+                            (s for s in upload_sessions.values()
+                             if file_info["content_hash"] and s.content_hash == file_info["content_hash"]
+                             and s.state != UploadSession.REJECTED),
+                            None
+                        ) or UploadSession(upload_identity, file_info)
+                        upload_sessions[upload_identity] = upload_session
+                # 只保留当前文件的渲染结果
+                for other_session in upload_sessions.values():
+                    if other_session is not upload_session:
+                        other_session.release_renders()
+                
+                file_info = upload_session.file_info if upload_session else None
                 if file_info:
-                    is_valid, error_msg = file_validator.validate_file(uploaded_file.name, len(uploaded_file.getvalue()))
-                    if not is_valid:
-                        st.error(f"文件验证失败: {error_msg}")
+                    if upload_session.state == UploadSession.RECEIVED:
+                        is_valid, error_msg = not file_info["error"], file_info["error"]
+                        if is_valid:
+                            is_valid, error_msg = file_validator.validate_file(file_info["filename"], file_info["file_size"])
+                        if not is_valid:
+                            upload_session.reject(error_msg)
+                        else:
+                            # 接收时已按内容哈希写入磁盘
+                            upload_session.stored(file_info["file_path"])
+                    
+                    if upload_session.state == UploadSession.REJECTED:
+                        st.error(f"文件验证失败: {upload_session.error}")
                     else:
-                        # 保存原始文件到磁盘
-                        file_path = file_uploader.save_to_disk(file_info)
+                        file_path = upload_session.file_path
                         
                         # 证书预览和处理
                         st.subheader("📋 证书预览与处理")
@@ -136,17 +164,101 @@ def show_main_page():
                         file_ext = file_info["file_ext"].lower()
                         original_img = None
                         
+                        # 按处理尺寸直接渲染/解码，不再先得到完整分辨率再缩小
+                        # 取宽高较大值作为边界，旋转后仍有足够的分辨率
+                        render_size = max(st.session_state.get("width_input", 800),
+                                          st.session_state.get("height_input", 1200))
+                        
                         if file_ext == ".pdf":
                             # PDF文件处理
                             pdf_info = pdf_converter.extract_pdf_info(file_path)
                             num_pages = pdf_info["num_pages"]
                             page_num = 0
-                            
-                            # 根据选择的页码转换PDF为图片
-                            original_img = pdf_converter.pdf_to_image(file_path, page_num)
+                            if num_pages > 1:
+                                # 多页PDF（如团队证书合集）可选择任意一页处理
+                                page_num = st.selectbox(
+                                    "选择页面",
+                                    list(range(num_pages)),
+                                    format_func=lambda p: f"第{p + 1}页",
+                                    key="pdf_page_select"
+                                )
+                        
+                        # 同一页、同一处理尺寸的渲染/解码结果在重新运行之间复用
+                        render_key = (page_num if file_ext == ".pdf" else 0, render_size)
+                        cached_render = upload_session.cached_render(render_key)
+                        if cached_render:
+                            original_img, load_stats = cached_render
+                        elif file_ext == ".pdf":
+                            original_img = pdf_converter.pdf_to_image(file_path, page_num,
+                                                                      max_width=render_size,
+                                                                      max_height=render_size)
+                            load_stats = {}
                         else:
-                            # 图片文件处理
-                            original_img = Image.open(file_path)
+                            # 图片文件处理（JPEG 按接近目标尺寸的比例解码）
+                            original_img = image_processor.load_image(file_path, render_size, render_size)
+                            load_stats = dict(image_processor.last_load_stats)
+                        if not cached_render:
+                            upload_session.cache_render(render_key, original_img, load_stats)
+                        
+                        # 自动裁剪：在上面的渲染结果上检测证书内容区域，再只把该区域按处理尺寸重新渲染/解码，
+                        # 裁剪后的证书内容获得全部像素，而不是在已缩小的整页上裁掉一部分
+                        source_img, crop_stats = original_img, {}
+                        if st.session_state.get("auto_crop", True):
+                            cached_crop = upload_session.cached_crop(render_key)
+                            if cached_crop:
+                                source_img, crop_stats = cached_crop
+                            else:
+                                region = image_processor.content_region(original_img)
+                                crop_stats = dict(image_processor.last_crop_stats)
+                                if region and file_ext == ".pdf":
+                                    source_img = pdf_converter.pdf_to_image(file_path, page_num,
+                                                                            max_width=render_size,
+                                                                            max_height=render_size,
+                                                                            region=region)
+                                elif region:
+                                    source_img = image_processor.load_image(file_path, render_size, render_size,
+                                                                            region=region)
+                                upload_session.cache_crop(render_key, source_img, crop_stats)
+                        
+                        if upload_session.state == UploadSession.STORED:
+                            from modules.database import db
+                            from modules.phash_index import dhash, phash_index
+                            # 近似重复检测：每个上传文件只计算一次感知哈希（PDF按首页），在登记之前查询
+                            if upload_session.duplicate is None:
+                                hash_img = original_img
+                                if file_ext == ".pdf" and page_num != 0:
+                                    hash_img = pdf_converter.pdf_to_image(file_path, 0, max_width=render_size,
+                                                                          max_height=render_size)
+                                phash = dhash(hash_img)
+                                matches = phash_index.find_similar(phash)
+                                upload_session.duplicate = {
+                                    "phash": phash,
+                                    "matches": matches,
+                                    "record": db.get_certificate_by_files([m["file_id"] for m in matches])
+                                }
+                            
+                            # 登记上传记录，每次上传只插入一行；失败时保持 stored 状态，下次运行重试
+                            file_id = db.register_uploaded_file(
+                                filename=file_info["filename"],
+                                file_path=file_path,
+                                file_type=file_info["file_type"],
+                                file_size=file_info["stored_size"],
+                                user_id=user["id"],  # 使用当前用户ID
+                                phash=upload_session.duplicate["phash"],
+                                content_hash=file_info["content_hash"]
+                            )
+                            if file_id:
+                                upload_session.registered(file_id)
+                                # 生成预览图金字塔，查看证书时直接读取小图，不再解码原文件
+                                from modules.preview_pyramid import preview_pyramid
+                                try:
+                                    preview_pyramid.generate(file_path, file_ext)
+                                except Exception as e:
+                                    st.warning(f"{str(e)}，查看证书时将重新生成")
+                        duplicate = upload_session.duplicate
+                        
+                        # 上传文件ID供证书记录关联
+                        st.session_state["uploaded_file_id"] = upload_session.file_id or 0
                         
                         # 创建两列
                         col1, col2 = st.columns(2)
@@ -160,25 +272,117 @@ def show_main_page():
                                 st.image(original_img, caption=f"PDF第{page_num + 1}页", use_column_width=True)
                             else:
                                 st.image(original_img, caption="原始图片", use_column_width=True)
+                                if load_stats.get("reduction", 1) > 1:
+                                    st.caption(
+                                        f"原图 {load_stats['original_size'][0]}×{load_stats['original_size'][1]}，"
+                                        f"按 {load_stats['decoded_size'][0]}×{load_stats['decoded_size'][1]} 解码"
+                                        f"（像素减少 {load_stats['reduction']:.0f} 倍），用时 {load_stats['decode_ms']:.0f} ms"
+                                    )
+                            
+                            if duplicate["matches"]:
+                                st.warning(
+                                    f"⚠️ 该证书与 {len(duplicate['matches'])} 份已上传的证书高度相似"
+                                    f"（最小差异 {duplicate['matches'][0]['distance']} 位），请确认是否重复提交"
+                                )
+                                if duplicate["record"] and st.button("♻️ 复用已有提取结果（无需重新识别）", use_container_width=True):
+                                    from modules.certificate_extractor import CertificateExtractor
+                                    st.session_state["extracted_info"] = CertificateExtractor.record_to_extracted_data(duplicate["record"])
+                                    st.session_state["show_extracted_info"] = True
+                                    st.success("已载入相似证书的提取结果，请核实后提交")
                             
                             # 添加信息提取按钮
                             st.markdown("---")
                             st.markdown("### 智能信息提取")
+                            extract_all_pages = False
+                            if file_ext == ".pdf" and num_pages > 1:
+                                extract_all_pages = st.checkbox(
+                                    f"逐页提取全部{num_pages}页（每页保存为一条证书草稿）",
+                                    key="extract_all_pages"
+                                )
                             extract_button = st.button("🔍 提取证书信息", type="primary", use_container_width=True)
                             
-                            if extract_button:
+                            if extract_button and extract_all_pages:
+                                # 多页PDF逐页提取：页面在进程池中并行渲染，按页码顺序依次提取并保存草稿
+                                from modules.database import db
+                                user = st.session_state.user_info
+                                uploaded_file_id = st.session_state.get("uploaded_file_id", 0)
+                                from modules.certificate_extractor import get_extractor
+                                extractor = get_extractor()
+                                
+                                progress = st.progress(0.0, text="正在逐页提取证书信息...")
+                                saved_pages, failed_pages = [], []
+                                for done, (page_index, page_img) in enumerate(pdf_converter.iter_pages(
+                                        file_path,
+                                        max_width=render_size,
+                                        max_height=render_size), start=1):
+                                    try:
+                                        page_angle = st.session_state.get("rotate_slider", 0.0)
+                                        if st.session_state.get("auto_rotate", True):
+                                            page_angle += image_processor.detect_rotation(page_img)["angle"]
+                                        if st.session_state.get("auto_crop", True):
+                                            # 与单页处理相同：只把证书内容区域按处理尺寸重新渲染
+                                            page_region = image_processor.content_region(page_img)
+                                            if page_region:
+                                                page_img = pdf_converter.pdf_to_image(file_path, page_index,
+                                                                                      max_width=render_size,
+                                                                                      max_height=render_size,
+                                                                                      region=page_region)
+                                        page_processed = image_processor.process_image(
+                                            page_img,
+                                            st.session_state.get("width_input", 800),
+                                            st.session_state.get("height_input", 1200),
+                                            page_angle,
+                                            st.session_state.get("normalize_image", False),
+                                            st.session_state.get("grayscale_image", False),
+                                            st.session_state.get("binarize_image", False)
+                                        )
+                                        page_info = extractor.validate_extracted_data(
+                                            extractor.extract_certificate_info(image_processor.encode_image(
+                                                page_processed,
+                                                st.session_state.get("payload_limit_kb", PAYLOAD_MAX_BYTES // 1024) * 1024
+                                            ).data_uri)
+                                        )
+                                        success = db.save_certificate_record(
+                                            student_college=page_info.get("学生所在学院", ""),
+                                            competition_name=page_info.get("竞赛项目", ""),
+                                            student_id=user['username'] if user['role'] == 'student' else page_info.get("学号", ""),
+                                            student_name=user['real_name'] if user['role'] == 'student' else page_info.get("学生姓名", ""),
+                                            award_category=page_info.get("获奖类别", ""),
+                                            award_level=page_info.get("获奖等级", ""),
+                                            competition_type=page_info.get("竞赛类型", ""),
+                                            organizing_unit=page_info.get("主办单位", ""),
+                                            award_date=page_info.get("获奖时间", ""),
+                                            advisor_name=user['real_name'] if user['role'] == 'teacher' else page_info.get("指导教师", ""),
+                                            upload_file_id=uploaded_file_id,
+                                            user_id=user["id"],
+                                            status="draft",
+                                            advisor_user_id=user["id"] if user['role'] == 'teacher' else None
+                                        )
+                                        (saved_pages if success else failed_pages).append(page_index + 1)
+                                    except Exception as e:
+                                        failed_pages.append(page_index + 1)
+                                        st.warning(f"第{page_index + 1}页提取失败: {str(e)}")
+                                    progress.progress(done / num_pages, text=f"已处理 {done}/{num_pages} 页")
+                                
+                                if saved_pages:
+                                    st.success(f"已保存 {len(saved_pages)} 条证书草稿，请在“我的证书”中核实后提交")
+                                if failed_pages:
+                                    st.error(f"以下页面未能保存: {', '.join(f'第{p}页' for p in failed_pages)}")
+                            elif extract_button:
                                 with st.spinner("正在智能提取证书信息..."):
                                     try:
-                                        # 从session状态获取之前生成的base64字符串
-                                        if "certificate_base64" not in st.session_state:
+                                        # 按预览时记录的编辑参数在原图上处理并编码（已生成时直接复用）
+                                        if "proxy_editor" not in st.session_state:
                                             st.error("未找到证书的Base64编码，请先上传并处理证书图片")
                                             st.stop()
                                         
-                                        base64_str = st.session_state["certificate_base64"]
+                                        base64_str = st.session_state["proxy_editor"].encode(
+                                            st.session_state.get("payload_limit_kb", PAYLOAD_MAX_BYTES // 1024) * 1024
+                                        ).data_uri
                                         
                                         # 调用证书提取器，直接传入base64字符串
-                                        from modules.certificate_extractor import CertificateExtractor
-                                        extractor = CertificateExtractor(api_key="869009c52642440daa5b791e2b3c61b7.FooxInR1ve4l4M7h") 
+                                        from modules.certificate_extractor import get_extractor
+                                        extractor = get_extractor()
                                         extracted_info = extractor.extract_certificate_info(base64_str)
                                         
                                         # 验证提取结果
@@ -328,7 +532,8 @@ def show_main_page():
                                                 advisor_name=advisor,
                                                 upload_file_id=uploaded_file_id,
                                                 user_id=user["id"],
-                                                status="draft"  # 保存为草稿状态
+                                                status="draft",  # 保存为草稿状态
+                                                advisor_user_id=user["id"] if user['role'] == 'teacher' else None
                                             )
                                             
                                             if success:
@@ -398,7 +603,8 @@ def show_main_page():
                                                     advisor_name=advisor,
                                                     upload_file_id=uploaded_file_id,  # 使用实际的上传文件ID
                                                     user_id=user["id"],  # 当前用户ID
-                                                    status="submitted"
+                                                    status="submitted",
+                                                    advisor_user_id=user["id"] if user['role'] == 'teacher' else None
                                                 )
                                                 
                                                 if success:
@@ -418,86 +624,108 @@ def show_main_page():
                             
                             # 图片处理选项
                             st.markdown("#### 图片处理")
+                            auto_rotate = st.checkbox("自动校正方向和倾斜", value=True, key="auto_rotate")
+                            auto_crop = st.checkbox("自动裁剪空白边距和背景", value=True, key="auto_crop")
                             rotate_angle = st.slider("旋转角度", -180.0, 180.0, 0.0, 1.0, key="rotate_slider")
                             max_width = st.number_input("最大宽度", 100, 2000, 800, 50, key="width_input")
                             max_height = st.number_input("最大高度", 100, 2000, 1200, 50, key="height_input")
+                            enhance_col1, enhance_col2, enhance_col3 = st.columns(3)
+                            with enhance_col1:
+                                normalize = st.checkbox("增强对比度", value=False, key="normalize_image")
+                            with enhance_col2:
+                                grayscale = st.checkbox("灰度", value=False, key="grayscale_image")
+                            with enhance_col3:
+                                binarize = st.checkbox("二值化", value=False, key="binarize_image")
+                            
+                            # 同一文件（PDF为同一页）的检测结果和编辑代理在重新运行之间复用
+                            upload_key = f"{upload_session.content_hash}:{page_num if file_ext == '.pdf' else 0}"
+                            
+                            # 自动检测方向和倾斜，每个文件只检测一次，滑块在此基础上微调
+                            auto_angle = 0.0
+                            if auto_rotate:
+                                detections = st.session_state.setdefault("auto_rotation", {})
+                                if upload_key not in detections:
+                                    detections[upload_key] = image_processor.detect_rotation(original_img)
+                                detection = detections[upload_key]
+                                auto_angle = detection["angle"]
+                                if auto_angle:
+                                    st.caption(f"已自动校正 {auto_angle:.2f}°（方向 {detection['orientation']}°，倾斜 {detection['skew']:+.2f}°）")
+                            
+                            # 交互调整只在代理图上进行，提取或下载时才在原图上完整处理一次
+                            # 开启自动裁剪时编辑的是按内容区域重新渲染/解码的图片，无需再裁剪
+                            editor_key = f"{upload_key}:{render_size}:{auto_crop}"
+                            editor = st.session_state.get("proxy_editor")
+                            if editor is None or st.session_state.get("proxy_editor_key") != editor_key:
+                                editor = ProxyEditor(source_img, image_processor)
+                                st.session_state["proxy_editor"] = editor
+                                st.session_state["proxy_editor_key"] = editor_key
                             
-                            # 处理图片
-                            processed_img = image_processor.process_image(original_img, max_width, max_height, rotate_angle)
+                            preview_img = editor.preview(max_width, max_height, auto_angle + rotate_angle,
+                                                         normalize, grayscale, binarize)
+                            if auto_crop and crop_stats.get("area_saved"):
+                                st.caption(f"已裁掉 {crop_stats['area_saved']:.0%} 的空白边距/背景，"
+                                           f"证书内容按 {source_img.width}×{source_img.height} 重新渲染")
                             
                             # 添加预览控制
                             st.markdown("#### 预览控制")
                             processed_zoom = st.slider("缩放比例", 0.1, 3.0, 1.0, 0.1, key="zoom_slider_processed")
                             
-                            # 显示处理后的图片 - 移除use_column_width=True，让width参数生效
+                            # 显示处理后的图片 - 按最终结果的尺寸显示代理图
                             st.image(
-                                processed_img,
+                                preview_img,
                                 caption="处理后的图片预览",
-                                width=int(processed_img.width * processed_zoom)
+                                width=int(preview_img.width / editor.preview_scale * processed_zoom)
                             )
                             
-                            # Base64编码生成
+                            # Base64编码生成（按载荷上限选择质量、尺寸和颜色模式）
                             st.markdown("#### Base64编码")
-                            base64_str = image_processor.image_to_base64(processed_img)
-                            # 将base64_str保存到session状态中，供提取按钮使用
-                            st.session_state["certificate_base64"] = base64_str
-                            st.code(base64_str[:200] + "..." if len(base64_str) > 200 else base64_str, language="text")
+                            payload_limit_kb = st.number_input("载荷上限 (KB)", 64, 4096, PAYLOAD_MAX_BYTES // 1024, 64,
+                                                               key="payload_limit_kb")
+                            encoded = editor.encoded(payload_limit_kb * 1024)
+                            if encoded is None:
+                                st.info("调整完成后生成最终图片；点击“提取证书信息”时也会自动生成")
+                                if st.button("⚙️ 生成Base64编码和下载文件", use_container_width=True):
+                                    with st.spinner("正在按原图分辨率处理..."):
+                                        encoded = editor.encode(payload_limit_kb * 1024)
                             
-                            # 复制Base64按钮 - 使用HTML按钮配合JavaScript，避免Streamlit表单限制
-                            copy_button_html = '''
-                            <script>
-                            function copyToClipboard() {
-                                navigator.clipboard.writeText('%s');
-                                alert("Base64编码已复制到剪贴板！");
-                            }
-                            </script>
-                            <button onclick="copyToClipboard()" style="background-color: #4CAF50; color: white; padding: 8px 16px; border: none; border-radius: 4px; cursor: pointer;">
-                                📋 复制Base64编码
-                            </button>
-                            ''' % base64_str
-                            st.markdown(copy_button_html, unsafe_allow_html=True)
-                            
-                            # 下载处理后的图片 - 现在不在表单内部
-                            st.markdown("#### 下载图片")
-                            
-                            # 正确处理base64字符串，解码为图片字节
-                            import base64
-                            base64_data = base64_str.split(",")[1]  # 获取base64数据部分
-                            processed_img_bytes = base64.b64decode(base64_data)  # 解码为图片字节
-                            
-                            # 生成正确的文件名，确保使用.jpg扩展名
-                            base_name = os.path.splitext(uploaded_file.name)[0]
-                            st.download_button(
-                                label="下载处理后的图片",
-                                data=processed_img_bytes,
-                                file_name=f"processed_{base_name}.jpg",
-                                mime="image/jpeg"
-                            )
-                        
-                        # 保存处理后的文件
-                        from modules.database import db
-                        success = db.save_uploaded_file(
-                            filename=uploaded_file.name,
-                            file_path=file_path,
-                            file_type=file_info["file_ext"][1:],
-                            file_size=file_info["file_size"],
-                            user_id=user["id"]  # 使用当前用户ID
-                        )
+                            if encoded is not None:
+                                base64_str = encoded.data_uri
+                                st.caption(
+                                    f"载荷 {len(base64_str) / 1024:.0f} KB：{encoded.size[0]}×{encoded.size[1]}，"
+                                    f"JPEG 质量 {encoded.quality}，{'灰度' if encoded.grayscale else '彩色'}，"
+                                    f"{'渐进式' if encoded.progressive else '基线式'}"
+                                )
+                                st.code(base64_str[:200] + "..." if len(base64_str) > 200 else base64_str, language="text")
+                                
+                                # 复制Base64按钮 - 使用HTML按钮配合JavaScript，避免Streamlit表单限制
+                                copy_button_html = '''
+                                <script>
+                                function copyToClipboard() {
+                                    navigator.clipboard.writeText('%s');
+                                    alert("Base64编码已复制到剪贴板！");
+                                }
+                                </script>
+                                <button onclick="copyToClipboard()" style="background-color: #4CAF50; color: white; padding: 8px 16px; border: none; border-radius: 4px; cursor: pointer;">
+                                    📋 复制Base64编码
+                                </button>
+                                ''' % base64_str
+                                st.markdown(copy_button_html, unsafe_allow_html=True)
+                                
+                                # 下载处理后的图片 - 现在不在表单内部
+                                st.markdown("#### 下载图片")
+                                
+                                # 生成正确的文件名，确保使用.jpg扩展名
+                                base_name = os.path.splitext(uploaded_file.name)[0]
+                                st.download_button(
+                                    label="下载处理后的图片",
+                                    data=encoded.data,
+                                    file_name=f"processed_{base_name}.jpg",
+                                    mime="image/jpeg"
+                                )
                         
-                        # 获取上传文件的ID，用于后续保存证书记录
-                        # 这里简化处理，获取最新上传的文件ID
-                        uploaded_file_id = 0
-                        if success:
-                            # 获取当前用户最近上传的文件
-                            user_files = db.get_user_files(user_id=user["id"])
-                            if user_files:
-                                # 按上传时间降序排列，取第一个
-                                uploaded_file_id = user_files[0]["id"]
-                            
-                            # 将上传文件ID保存到session状态，供表单使用
-                            st.session_state["uploaded_file_id"] = uploaded_file_id
-                            
-                            st.success(f"证书上传成功！已保存至根目录下的 uploads 文件夹。文件ID: {uploaded_file_id}")
+                        # 上传记录在首次运行时登记，之后的重新运行沿用同一文件ID
+                        if upload_session.state == UploadSession.REGISTERED:
+                            st.success(f"证书上传成功！已保存至根目录下的 uploads 文件夹。文件ID: {upload_session.file_id}")
                         else:
                             st.error("保存文件信息失败")
         elif page == "个人设置":
@@ -530,7 +758,46 @@ def show_admin_dashboard(auth):
     
     # 最新活动
     st.markdown("### 📝 最近活动")
-    # 这里可以显示最近的操作日志
+
+    # 游标栈：记录每一页的起始游标，支持上一页/下一页
+    if 'activity_cursors' not in st.session_state:
+        st.session_state.activity_cursors = [None]
+
+    page_size = 20
+    cursor = st.session_state.activity_cursors[-1]
+    activities = db.get_recent_activity(limit=page_size, cursor=cursor)
+
+    if not activities:
+        st.info("最近30天暂无活动记录")
+    else:
+        action_names = {'LOGIN': '登录', 'LOGOUT': '登出'}
+        st.dataframe(
+            [{
+                "time": a['created_at'],
+                "user": f"{a['real_name']} ({a['username']})" if a['username'] else a['user_id'],
+                "action": action_names.get(a['action'], a['action']),
+                "details": a['details']
+            } for a in activities],
+            column_config={
+                "time": "时间",
+                "user": "用户",
+                "action": "操作",
+                "details": "详情"
+            },
+            hide_index=True,
+            use_container_width=True
+        )
+
+    nav_col1, nav_col2 = st.columns(2)
+    with nav_col1:
+        if len(st.session_state.activity_cursors) > 1 and st.button("⬅️ 上一页", key="activity_prev"):
+            st.session_state.activity_cursors.pop()
+            st.rerun()
+    with nav_col2:
+        if len(activities) == page_size and st.button("下一页 ➡️", key="activity_next"):
+            last = activities[-1]
+            st.session_state.activity_cursors.append({'created_at': last['created_at'], 'id': last['id']})
+            st.rerun()
 
 def show_student_dashboard():
     """显示学生仪表板"""
@@ -943,16 +1210,15 @@ def show_user_management(auth):
                                 st.markdown("### 证书预览")
                                 
                                 try:
+                                    # 读取上传时生成的预览图（PDF为首页），不解码原文件
+                                    from modules.preview_pyramid import preview_pyramid
+                                    preview_path = preview_pyramid.get(selected_cert['file_path'], selected_cert['file_type'], 800)
                                     if selected_cert['file_type'] == 'pdf':
-                                        # PDF文件预览
                                         st.markdown(f"**文件名:** {selected_cert['filename']}")
                                         st.markdown(f"**文件类型:** PDF")
-                                        st.info("PDF文件预览功能开发中，可直接下载查看")
+                                        st.image(preview_path, caption=f"{selected_cert['filename']}（第1页）", use_column_width=True)
                                     else:
-                                        # 图片文件预览
-                                        from PIL import Image
-                                        image = Image.open(selected_cert['file_path'])
-                                        st.image(image, caption=selected_cert['filename'], use_column_width=True)
+                                        st.image(preview_path, caption=selected_cert['filename'], use_column_width=True)
                                 except Exception as e:
                                     st.error(f"预览失败: {str(e)}")
                                 
@@ -967,7 +1233,8 @@ def show_user_management(auth):
                                     st.download_button(
                                         label="下载证书文件",
                                         data=file_data,
-                                        file_name=selected_cert['filename'],
+                                        # 原文件可能已被重新压缩为其他格式，扩展名以 file_type 为准
+                                        file_name=f"{os.path.splitext(selected_cert['filename'])[0]}.{selected_cert['file_type']}",
                                         mime=f"application/{selected_cert['file_type']}" if selected_cert['file_type'] == 'pdf' else f"image/{selected_cert['file_type']}"
                                     )
                                 except Exception as e:
@@ -1396,7 +1663,9 @@ def show_my_certificates(user):
                                         competition_type=competition_type,
                                         organizing_unit=organizing_unit,
                                         award_date=award_date,
-                                        advisor_name=advisor_name
+                                        advisor_name=advisor_name,
+                                        # 教师修改本人指导的证书时直接关联本人ID，避免重名匹配失败
+                                        advisor_user_id=user['id'] if user['role'] == 'teacher' and advisor_name == user['real_name'] else None
                                     )
                                     
                                     if success:
@@ -1476,16 +1745,15 @@ def show_my_certificates(user):
                 st.markdown("### 证书预览")
                 
                 try:
+                    # 读取上传时生成的预览图（PDF为首页），不解码原文件
+                    from modules.preview_pyramid import preview_pyramid
+                    preview_path = preview_pyramid.get(selected_cert['file_path'], selected_cert['file_type'], 800)
                     if selected_cert['file_type'] == 'pdf':
-                        # PDF文件预览
                         st.markdown(f"**文件名:** {selected_cert['filename']}")
                         st.markdown(f"**文件类型:** PDF")
-                        st.info("PDF文件预览功能开发中，可直接下载查看")
+                        st.image(preview_path, caption=f"{selected_cert['filename']}（第1页）", use_column_width=True)
                     else:
-                        # 图片文件预览
-                        from PIL import Image
-                        image = Image.open(selected_cert['file_path'])
-                        st.image(image, caption=selected_cert['filename'], use_column_width=True)
+                        st.image(preview_path, caption=selected_cert['filename'], use_column_width=True)
                 except Exception as e:
                     st.error(f"预览失败: {str(e)}")
                 
@@ -1500,7 +1768,8 @@ def show_my_certificates(user):
                     st.download_button(
                         label="下载证书文件",
                         data=file_data,
-                        file_name=selected_cert['filename'],
+                        # 原文件可能已被重新压缩为其他格式，扩展名以 file_type 为准
+                        file_name=f"{os.path.splitext(selected_cert['filename'])[0]}.{selected_cert['file_type']}",
                         mime=f"{selected_cert['file_type']}/{selected_cert['file_type']}"
                     )
                 except Exception as e:
@@ -1573,11 +1842,23 @@ def show_personal_settings(user):
                 st.error("个人信息更新失败")
 
 
+def bind_db_session():
+    """将数据库读写路由绑定到当前浏览器会话"""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+        db.bind_session(ctx.session_id if ctx else None)
+    except ImportError:
+        db.bind_session(None)
+
 def main():
     """主函数"""
     # 初始化session状态
     init_session_state()
     
+    # 会话写入后短时间内的读请求走主库
+    bind_db_session()
+    
     # 检查登录状态
     if not st.session_state.authenticated:
         show_login_page()
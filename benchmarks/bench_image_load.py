@@ -0,0 +1,241 @@
+# benchmarks/bench_image_load.py
+"""
+JPEG 上传解码基准：对比 完整解码后缩小 与 按 DCT 比例缩放解码（draft）后缩小 的耗时，
+包括上传页预览流程（读取 + process_image + Base64 编码）的总耗时；
+以及 先旋转完整分辨率再缩小 与 先缩小再旋转（直角走转置）的耗时、自动方向/倾斜检测的耗时、
+autocontrast + equalize 两遍处理 与 合并查找表一遍处理 的耗时，
+以及自动裁剪前后发送给提取接口的 Base64 大小、上传页 在处理尺寸的渲染结果上裁剪 与 按内容区域重新渲染/解码
+得到的证书内容像素、固定质量95编码 与 按载荷上限编码 的大小和耗时，
+以及拖动滑块时每次重新运行 在原图上处理并编码 与 只在代理图上预览 的耗时；
+并检查自动方向检测：证书各直角方向都能校正，test.pdf 的插图不被旋转
+
+    python benchmarks/bench_image_load.py
+"""
+import os
+import sys
+import time
+import tempfile
+from PIL import Image, ImageOps
+
+# 添加项目根目录到Python路径
+project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_dir)
+
+from modules.image_processor import ImageProcessor, ProxyEditor, PAYLOAD_MAX_BYTES
+from modules.pdf_converter import PDFConverter
+
+JPEG_FILES = [
+    os.path.join(project_dir, "test_files", "test.jpg"),
+    os.path.join(project_dir, "test_files", "test5.jpg"),
+]
+# 模拟手机拍摄的 12MP 证书照片
+PHOTO_SIZE = (4000, 3000)
+MAX_WIDTH, MAX_HEIGHT = 800, 1200
+REPEAT = 5
+ROTATE_ANGLES = [90, 180, 15, -30]
+# 自动检测：直角方向 + 扫描件常见的小角度倾斜（检测范围 ±10°）
+DETECT_ANGLES = [90, 180, 270, -4, 3]
+
+
+def measure(func):
+    """返回平均耗时（ms）"""
+    func()  # 预热
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        func()
+    return (time.perf_counter() - start) / REPEAT * 1000
+
+
+def make_photo(temp_dir):
+    """用测试证书放大生成 12MP JPEG"""
+    photo_path = os.path.join(temp_dir, "photo_12mp.jpg")
+    with Image.open(JPEG_FILES[-1]) as src:
+        src.convert("RGB").resize(PHOTO_SIZE, Image.BICUBIC).save(photo_path, quality=90)
+    return photo_path
+
+
+def bench_rotation(processor, img):
+    """process_image 的旋转部分：旧流程在完整分辨率上旋转后再缩小"""
+    def rotate_then_resize(angle):
+        rotated = img.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor="white")
+        return processor.resize_image(rotated, MAX_WIDTH, MAX_HEIGHT)
+
+    print(f"\n旋转 {img.width}x{img.height} 并缩小到 {MAX_WIDTH}x{MAX_HEIGHT}")
+    for angle in ROTATE_ANGLES:
+        before = measure(lambda: rotate_then_resize(angle))
+        after = measure(lambda: processor.process_image(img, MAX_WIDTH, MAX_HEIGHT, angle))
+        print(f"  {angle:5d}°  先旋转后缩小 {before:8.1f} ms   先缩小后旋转 {after:8.1f} ms   加速 {before / after:.1f}x")
+
+    print("\n自动方向/倾斜检测（在缩略图上进行）")
+    for angle in DETECT_ANGLES:
+        rotated = img.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor="white")
+        elapsed = measure(lambda: processor.detect_rotation(rotated))
+        detected = processor.detect_rotation(rotated)["angle"]
+        print(f"  旋转 {angle:5d}°  检测到校正 {detected:7.2f}°   {elapsed:8.1f} ms")
+
+
+def check_orientation(processor, img):
+    """
+    自动方向检测回归检查（上传页默认开启自动校正）：
+    证书各直角方向都应校正回正，白边页面上的插图（test.pdf）不论怎么放都不应被旋转
+    """
+    render_size = max(MAX_WIDTH, MAX_HEIGHT)
+    pdf_path = os.path.join(project_dir, "test_files", "test.pdf")
+    illustration = PDFConverter(cache=None).pdf_to_image(pdf_path, max_width=render_size, max_height=render_size)
+
+    print("\n自动方向检测回归检查")
+    for name, page, expected in (("证书", img, lambda angle: (360 - angle) % 360),
+                                 ("test.pdf", illustration, lambda angle: 0)):
+        for angle in (0, 90, 180, 270):
+            orientation = processor.detect_rotation(page.rotate(angle, expand=True))["orientation"]
+            assert orientation == expected(angle), f"{name} 旋转 {angle}° 检测到方向 {orientation}°"
+        print(f"  {name:<10} 通过")
+
+
+def bench_normalize(processor, img):
+    """标准化：ImageOps 两次直方图统计 + 两次映射 对比 一次直方图 + 一次查找表映射"""
+    def two_pass(target):
+        return ImageOps.equalize(ImageOps.autocontrast(target.convert("RGB"), cutoff=1))
+
+    print("\n标准化（自动对比度 + 均衡化）")
+    for target in (processor.resize_image(img, MAX_WIDTH, MAX_HEIGHT), img):
+        before = measure(lambda: two_pass(target))
+        after = measure(lambda: processor.normalize_image(target))
+        print(f"  {target.width}x{target.height}  两遍处理 {before:8.1f} ms   合并查找表 {after:8.1f} ms   加速 {before / after:.1f}x")
+
+
+def bench_crop_payload(processor, img):
+    """自动裁剪对 Base64 载荷的影响：白边较多的 PDF 页面、放在桌面上拍摄的证书"""
+    desk = Image.new("RGB", (3000, 3600), (120, 80, 50))
+    desk.paste(img.convert("RGB").resize((1860, 2631)), (450, 600))
+    pdf_page = PDFConverter(cache=None).pdf_to_image(os.path.join(project_dir, "test_files", "test.pdf"),
+                                                     max_width=MAX_HEIGHT, max_height=MAX_HEIGHT)
+
+    print("\n自动裁剪后的 Base64 载荷")
+    for name, target in (("PDF 页面（白边）", pdf_page), ("桌面拍摄照片", desk)):
+        plain_img = processor.process_image(target, MAX_WIDTH, MAX_HEIGHT)
+        plain = len(processor.image_to_base64(plain_img))
+        # 同样的尺寸上限：证书内容占到更多像素，文字更清晰
+        same_budget_img = processor.process_image(target, MAX_WIDTH, MAX_HEIGHT, crop=True)
+        same_budget = len(processor.image_to_base64(same_budget_img))
+        area_saved = processor.last_crop_stats["area_saved"]
+        # 同样的文字分辨率：只是去掉了背景，载荷变小
+        scale = plain_img.width / target.width
+        cropped_width, cropped_height = processor.last_crop_stats["cropped_size"]
+        same_scale = len(processor.image_to_base64(processor.process_image(
+            target, round(cropped_width * scale), round(cropped_height * scale), crop=True)))
+        elapsed = measure(lambda: processor.auto_crop(target))
+        print(f"  {name:<12} 裁掉面积 {area_saved:4.0%}   检测+裁剪 {elapsed:6.1f} ms")
+        print(f"    不裁剪 {plain_img.width}x{plain_img.height}          {plain / 1024:7.1f} KB")
+        print(f"    裁剪，同样尺寸上限 {same_budget_img.width}x{same_budget_img.height}  {same_budget / 1024:7.1f} KB"
+              f"   内容像素 x{same_budget_img.width * same_budget_img.height / (plain_img.width * plain_img.height * (1 - area_saved)):.1f}")
+        print(f"    裁剪，同样文字分辨率            {same_scale / 1024:7.1f} KB   载荷 -{1 - same_scale / plain:.0%}")
+
+
+def bench_crop_region(processor, img, temp_dir):
+    """
+    上传页流程：PDF/图片先按处理尺寸渲染/解码，只缩不放，之后再裁剪只会丢掉像素；
+    在渲染结果上检测内容区域，再只把区域按处理尺寸重新渲染/解码，证书内容获得全部像素
+    """
+    render_size = max(MAX_WIDTH, MAX_HEIGHT)
+    converter = PDFConverter(cache=None)
+    pdf_path = os.path.join(project_dir, "test_files", "test.pdf")
+    desk_path = os.path.join(temp_dir, "desk_photo.jpg")
+    desk = Image.new("RGB", (4000, 4800), (120, 80, 50))
+    desk.paste(img.convert("RGB").resize((2480, 3508)), (600, 800))
+    desk.save(desk_path, quality=90)
+
+    loaders = (
+        ("PDF 页面（白边）",
+         lambda region=None: converter.pdf_to_image(pdf_path, max_width=render_size, max_height=render_size,
+                                                    region=region)),
+        ("桌面拍摄照片",
+         lambda region=None: processor.load_image(desk_path, render_size, render_size, region=region)),
+    )
+    print(f"\n上传页自动裁剪（处理尺寸 {MAX_WIDTH}x{MAX_HEIGHT}）")
+    for name, load in loaders:
+        rendered = load()
+        cropped = processor.process_image(rendered, MAX_WIDTH, MAX_HEIGHT, crop=True)
+        region = processor.content_region(rendered)
+        region_img = processor.process_image(load(region), MAX_WIDTH, MAX_HEIGHT)
+        elapsed = measure(lambda: load(processor.content_region(load())))
+        print(f"  {name:<12} 渲染后裁剪 {cropped.width}x{cropped.height}   按区域重新渲染 "
+              f"{region_img.width}x{region_img.height}   内容像素 "
+              f"x{region_img.width * region_img.height / (cropped.width * cropped.height):.1f}   "
+              f"渲染+检测+区域渲染 {elapsed:6.1f} ms")
+
+
+def bench_payload(processor, img):
+    """Base64 载荷：固定质量95 与 按上限编码"""
+    print(f"\nBase64 载荷（上限 {PAYLOAD_MAX_BYTES // 1024} KB）")
+    for max_side in (MAX_HEIGHT, 2000):
+        target = processor.process_image(img, max_side, max_side)
+        fixed = len(processor.image_to_base64(target))
+        encoded = processor.encode_image(target)
+        elapsed = measure(lambda: processor.encode_image(target))
+        print(f"  {target.width}x{target.height}  质量95 {fixed / 1024:7.1f} KB   按上限 {len(encoded.data_uri) / 1024:7.1f} KB"
+              f"（{encoded.size[0]}x{encoded.size[1]}，质量 {encoded.quality}）   编码 {elapsed:6.1f} ms")
+
+
+def bench_proxy_editing(processor, img):
+    """模拟拖动旋转滑块：每一步都触发一次重新运行"""
+    angles = [1.0, 2.0, 3.0, 4.0]
+    editor = ProxyEditor(img, processor)
+
+    def full_rerun():
+        for angle in angles:
+            processor.encode_image(processor.process_image(img, MAX_WIDTH, MAX_HEIGHT, angle, crop=True))
+
+    def proxy_rerun():
+        for angle in angles:
+            editor.preview(MAX_WIDTH, MAX_HEIGHT, angle, crop=True)
+
+    before = measure(full_rerun) / len(angles)
+    after = measure(proxy_rerun) / len(angles)
+    commit = measure(lambda: ProxyEditor(img, processor).encode())
+    print(f"\n拖动旋转滑块（{img.width}x{img.height}，每步一次重新运行）")
+    print(f"  原图处理 + 编码                {before:8.1f} ms/步")
+    print(f"  代理图预览                     {after:8.1f} ms/步   加速 {before / after:.1f}x")
+    print(f"  提取/下载时原图处理 + 编码一次 {commit:8.1f} ms（含创建代理图）")
+
+
+def main():
+    processor = ImageProcessor()
+    render_size = max(MAX_WIDTH, MAX_HEIGHT)
+
+    def full_decode(path):
+        img = Image.open(path)
+        img.load()
+        return img
+
+    def preview(img):
+        return processor.image_to_base64(processor.process_image(img, MAX_WIDTH, MAX_HEIGHT))
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for path in JPEG_FILES + [make_photo(temp_dir)]:
+            processor.load_image(path, render_size, render_size)
+            stats = processor.last_load_stats
+            print(f"\n{os.path.basename(path)}  {stats['original_size'][0]}x{stats['original_size'][1]}"
+                  f" -> 解码 {stats['decoded_size'][0]}x{stats['decoded_size'][1]}")
+
+            full = measure(lambda: full_decode(path))
+            draft = measure(lambda: processor.load_image(path, render_size, render_size))
+            print(f"  完整解码                        {full:8.1f} ms")
+            print(f"  按比例解码（draft）             {draft:8.1f} ms   节省 {full - draft:.1f} ms")
+
+            full_total = measure(lambda: preview(full_decode(path)))
+            draft_total = measure(lambda: preview(processor.load_image(path, render_size, render_size)))
+            print(f"  预览流程：完整解码              {full_total:8.1f} ms")
+            print(f"  预览流程：按比例解码            {draft_total:8.1f} ms   加速 {full_total / draft_total:.1f}x")
+
+        bench_rotation(processor, full_decode(JPEG_FILES[-1]))
+        check_orientation(processor, full_decode(JPEG_FILES[-1]))
+        bench_normalize(processor, full_decode(JPEG_FILES[-1]))
+        bench_crop_payload(processor, full_decode(JPEG_FILES[-1]))
+        bench_crop_region(processor, full_decode(JPEG_FILES[-1]), temp_dir)
+        bench_payload(processor, full_decode(JPEG_FILES[-1]))
+        bench_proxy_editing(processor, full_decode(JPEG_FILES[-1]))
+
+
+if __name__ == "__main__":
+    main()
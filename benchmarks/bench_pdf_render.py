@@ -0,0 +1,172 @@
+# benchmarks/bench_pdf_render.py
+"""
+PDF 渲染基准：
+1. 对比 300 DPI 渲染后缩小 与 按目标尺寸直接渲染 的耗时和像素缓冲大小
+2. 对比 pixmap 经 PNG 编解码转 PIL 与 直接使用原始像素缓冲 的耗时和Python内存分配
+3. 上传页每次重新运行（读取PDF信息 + 渲染预览）时 每次重新打开文档 与 复用已打开文档 的耗时
+4. 40 页证书合集逐页串行渲染 与 进程池并行渲染 的耗时
+5. A0 海报页按 300 DPI 渲染时 受内存上限约束的实际分辨率和像素缓冲
+
+    python benchmarks/bench_pdf_render.py
+"""
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+from io import BytesIO
+import fitz
+from PIL import Image
+
+# 添加项目根目录到Python路径
+project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_dir)
+
+from modules.pdf_converter import PDFConverter, DocumentCache, PAGE_RENDER_WORKERS, pixmap_to_image
+from modules.memory_budget import MAX_DECODE_BYTES
+from modules.image_processor import ImageProcessor
+
+PDF_FILES = [
+    os.path.join(project_dir, "test_files", "test.pdf"),
+    os.path.join(project_dir, "test_files", "test_two.pdf"),
+]
+REPEAT = 5
+# 多页基准的页数（模拟团队证书合集）
+BUNDLE_PAGES = 40
+
+
+def measure(func):
+    """返回平均耗时（ms）"""
+    func()  # 预热
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        func()
+    return (time.perf_counter() - start) / REPEAT * 1000
+
+
+def buffer_mb(img):
+    """渲染出的RGB像素缓冲大小（MB），内存峰值主要由它决定"""
+    return img.width * img.height * 3 / 1024 / 1024
+
+
+def allocated_mb(func):
+    """
+    单次调用的内存分配（MB）：Python 堆峰值（PNG 字节串、中间 bytes 副本）+ PIL 像素缓冲
+    PIL 在C层分配的像素内存不被 tracemalloc 统计，按图片尺寸单独计入
+    """
+    tracemalloc.start()
+    img = func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (peak + img.width * img.height * len(img.getbands())) / 1024 / 1024
+
+
+def bench_pixmap_conversion(pdf_path):
+    """300 DPI pixmap 转 PIL 的两种方式"""
+    with fitz.open(pdf_path) as doc:
+        pix = doc[0].get_pixmap(dpi=300, alpha=False)
+
+        def via_png():
+            img = Image.open(BytesIO(pix.tobytes()))
+            img.load()
+            return img
+
+        def via_samples():
+            return pixmap_to_image(pix)
+
+        png = measure(via_png), allocated_mb(via_png)
+        raw = measure(via_samples), allocated_mb(via_samples)
+
+    print(f"  pixmap -> PNG 编码 -> PIL 解码   {png[0]:8.1f} ms   分配 {png[1]:6.1f} MB")
+    print(f"  pixmap 原始像素 -> PIL            {raw[0]:8.1f} ms   分配 {raw[1]:6.1f} MB")
+    print(f"  节省 {png[0] - raw[0]:.1f} ms/页（{png[0] / raw[0]:.0f}x）")
+
+
+def bench_document_reuse(pdf_path):
+    """模拟上传页一次重新运行：先读页数再渲染预览，关闭渲染缓存以突出打开文档的开销"""
+    def rerun(converter):
+        converter.extract_pdf_info(pdf_path)
+        converter.pdf_to_image(pdf_path, max_width=200, max_height=200)
+
+    reopen = measure(lambda: rerun(PDFConverter(cache=None, documents=None)))
+    shared = DocumentCache()
+    reuse = measure(lambda: rerun(PDFConverter(cache=None, documents=shared)))
+    print(f"  每次重新打开文档                 {reopen:8.1f} ms")
+    print(f"  复用已打开文档                   {reuse:8.1f} ms")
+
+
+def bench_multi_page(converter):
+    """用测试PDF拼出多页合集，对比串行与并行渲染全部页面"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        bundle_path = os.path.join(temp_dir, "bundle.pdf")
+        with fitz.open() as bundle:
+            while len(bundle) < BUNDLE_PAGES:
+                for pdf_path in PDF_FILES:
+                    with fitz.open(pdf_path) as src:
+                        bundle.insert_pdf(src)
+            bundle.select(list(range(BUNDLE_PAGES)))
+            bundle.save(bundle_path)
+
+        def render(workers):
+            start = time.perf_counter()
+            for _ in converter.iter_pages(bundle_path, workers=workers):
+                pass
+            return time.perf_counter() - start
+
+        render(PAGE_RENDER_WORKERS)  # 预热进程池
+        serial = render(1)
+        parallel = render(PAGE_RENDER_WORKERS)
+
+    print(f"\n{BUNDLE_PAGES} 页合集，300 DPI 全分辨率")
+    print(f"  串行渲染                          {serial:8.2f} s")
+    print(f"  进程池并行渲染（{PAGE_RENDER_WORKERS} 进程）       {parallel:8.2f} s")
+    print(f"  加速 {serial / parallel:.1f}x")
+
+
+def bench_poster_page(converter):
+    """A0 海报（841×1189 mm）按 300 DPI 完整渲染约 1.4 亿像素"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        poster_path = os.path.join(temp_dir, "poster.pdf")
+        doc = fitz.open()
+        page = doc.new_page(width=2384, height=3370)
+        page.insert_text((200, 400), "POSTER", fontsize=200)
+        doc.save(poster_path)
+        doc.close()
+
+        uncapped = (round(2384 * 300 / 72), round(3370 * 300 / 72))
+        elapsed = measure(lambda: converter.pdf_to_image(poster_path))
+        img = converter.pdf_to_image(poster_path)
+
+    print(f"\nA0 海报页，300 DPI（单页上限 {MAX_DECODE_BYTES / 1024 / 1024:.0f} MB）")
+    print(f"  不限制                            {uncapped[0]}×{uncapped[1]}   "
+          f"像素缓冲 {uncapped[0] * uncapped[1] * 3 / 1024 / 1024:6.1f} MB")
+    print(f"  按内存上限分块渲染   {elapsed:8.1f} ms   {img.width}×{img.height}   像素缓冲 {buffer_mb(img):6.1f} MB")
+
+
+def main():
+    # 关闭渲染缓存，只测渲染本身
+    converter = PDFConverter(cache=None)
+    processor = ImageProcessor()
+
+    for pdf_path in PDF_FILES:
+        name = os.path.basename(pdf_path)
+        print(f"\n{name}")
+
+        full = measure(lambda: processor.resize_image(converter.pdf_to_image(pdf_path), 800, 1200))
+        full_mb = buffer_mb(converter.pdf_to_image(pdf_path))
+        print(f"  300 DPI 渲染后缩小到 800x1200    {full:8.1f} ms   像素缓冲 {full_mb:6.1f} MB")
+
+        fit = measure(lambda: converter.pdf_to_image(pdf_path, max_width=800, max_height=1200))
+        fit_mb = buffer_mb(converter.pdf_to_image(pdf_path, max_width=800, max_height=1200))
+        print(f"  按 800x1200 直接渲染             {fit:8.1f} ms   像素缓冲 {fit_mb:6.1f} MB")
+        print(f"  加速 {full / fit:.1f}x，像素缓冲减少 {full_mb / fit_mb:.1f}x")
+
+        bench_pixmap_conversion(pdf_path)
+        bench_document_reuse(pdf_path)
+
+    bench_multi_page(converter)
+    bench_poster_page(converter)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# benchmarks/bench_queries.py
+"""
+数据库查询基准测试与简单压测
+
+默认使用嵌入式 SQLite 模式，无需启动数据库服务：
+    python benchmarks/bench_queries.py
+对 MySQL 运行（需先执行 init_db.sql，会写入测试数据，请勿对生产库运行）：
+    CB_DB_BACKEND=mysql python benchmarks/bench_queries.py
+"""
+import os
+import sys
+import time
+import tempfile
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import text
+
+# 默认使用临时 SQLite 数据库
+os.environ.setdefault('CB_DB_BACKEND', 'sqlite')
+if os.environ['CB_DB_BACKEND'] == 'sqlite':
+    os.environ.setdefault('CB_SQLITE_PATH', os.path.join(tempfile.mkdtemp(), 'bench.db'))
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.database import db
+
+NUM_TEACHERS = 50
+NUM_STUDENTS = 2000
+CERTS_PER_STUDENT = 3
+
+
+def seed():
+    """写入测试数据（直接批量插入，绕过 bcrypt 加密）"""
+    with db.get_session() as session:
+        session.execute(text(
+            "INSERT INTO users (username, password, role, real_name) VALUES (:username, 'x', :role, :real_name)"
+        ), [{'username': f"{90000000 + i}", 'role': 'teacher', 'real_name': f"教师{i}"} for i in range(NUM_TEACHERS)]
+           + [{'username': f"{2099000000000 + i}", 'role': 'student', 'real_name': f"学生{i}"} for i in range(NUM_STUDENTS)])
+        owner_id = session.execute(text("SELECT MIN(id) FROM users")).scalar()
+        session.execute(text(
+            "INSERT INTO files_uploads (filename, file_path, file_type, file_size, user_id) "
+            "VALUES ('bench.jpg', 'uploads/bench.jpg', 'jpg', 1, :user_id)"
+        ), {'user_id': owner_id})
+        file_id = session.execute(text("SELECT MAX(id) FROM files_uploads")).scalar()
+        teachers = session.execute(text("SELECT id, real_name FROM users WHERE role = 'teacher'")).all()
+
+        records = []
+        for i in range(NUM_STUDENTS):
+            for j in range(CERTS_PER_STUDENT):
+                teacher = teachers[(i + j) % len(teachers)]
+                records.append({
+                    'student_id': f"{2099000000000 + i}", 'student_name': f"学生{i}",
+                    'advisor_name': teacher.real_name, 'advisor_user_id': teacher.id,
+                    'upload_file_id': file_id, 'user_id': owner_id
+                })
+        session.execute(text(
+            "INSERT INTO certificate_records (student_id, student_name, advisor_name, advisor_user_id, upload_file_id, user_id) "
+            "VALUES (:student_id, :student_name, :advisor_name, :advisor_user_id, :upload_file_id, :user_id)"
+        ), records)
+        return [t.id for t in teachers]
+
+
+def timeit(label, func, repeat=200):
+    """重复执行并输出耗时统计"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    print(f"{label:<40} median {statistics.median(samples):8.3f} ms   p95 {sorted(samples)[int(repeat * 0.95) - 1]:8.3f} ms")
+
+
+def load_test(teacher_ids, workers=8, requests_per_worker=200):
+    """多线程并发读取教师证书列表"""
+    def worker(n):
+        for i in range(requests_per_worker):
+            db.get_user_certificates(teacher_ids[(n + i) % len(teacher_ids)], 'teacher')
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(worker, range(workers)))
+    elapsed = time.perf_counter() - start
+    total = workers * requests_per_worker
+    print(f"并发压测: {workers} 线程 {total} 次请求，耗时 {elapsed:.2f} s，{total / elapsed:.0f} req/s")
+
+
+def main():
+    print(f"数据库后端: {db.backend.name}")
+    teacher_ids = seed()
+
+    timeit("教师证书列表 get_user_certificates", lambda: db.get_user_certificates(teacher_ids[0], 'teacher'))
+    timeit("用户存在检查 user_exists", lambda: db.user_exists('90000001'))
+    timeit("用户查询 get_user_by_id", lambda: db.get_user_by_id(teacher_ids[0]))
+    timeit("全部证书 get_all_certificates", lambda: db.get_all_certificates(), repeat=20)
+
+    print("\n查询计划：教师证书列表")
+    for row in db.explain_query(
+        "SELECT cr.id FROM certificate_records cr WHERE cr.advisor_user_id = :user_id", {'user_id': teacher_ids[0]}
+    ):
+        print("   ", row)
+
+    print()
+    load_test(teacher_ids)
+
+
+if __name__ == "__main__":
+    main()
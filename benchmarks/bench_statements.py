@@ -0,0 +1,59 @@
+# benchmarks/bench_statements.py
+"""
+预编译语句微基准：对比每次调用 text(sql) 与复用 db.statements 中预编译语句的单次开销
+
+    python benchmarks/bench_statements.py
+"""
+import os
+import sys
+import time
+import tempfile
+
+# 默认使用临时 SQLite 数据库
+os.environ.setdefault('CB_DB_BACKEND', 'sqlite')
+if os.environ['CB_DB_BACKEND'] == 'sqlite':
+    os.environ.setdefault('CB_SQLITE_PATH', os.path.join(tempfile.mkdtemp(), 'bench.db'))
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from modules.database import db, STATEMENTS
+
+ITERATIONS = 20000
+
+
+def per_call_us(func, iterations=ITERATIONS):
+    """单次调用平均耗时（微秒）"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    print(f"数据库后端: {db.backend.name}，每项 {ITERATIONS} 次")
+    sql = STATEMENTS['user_exists']
+    statement = db.statements['user_exists']
+    params = {'username': '00000000'}
+
+    # 1. 只看语句构建：text() 需要解析绑定参数
+    build = per_call_us(lambda: text(sql))
+    print(f"构建 text(sql)                     {build:8.2f} us/次")
+
+    # 2. 同一连接上执行，排除会话与连接池开销
+    with db.engine.connect() as conn:
+        raw = per_call_us(lambda: conn.execute(text(sql), params).all())
+        prepared = per_call_us(lambda: conn.execute(statement, params).all())
+    print(f"连接上执行 text(sql)               {raw:8.2f} us/次")
+    print(f"连接上执行 预编译语句              {prepared:8.2f} us/次   节省 {raw - prepared:6.2f} us ({(raw - prepared) / raw:.0%})")
+
+    # 3. 完整调用路径：execute_query（含会话、路由）
+    raw_path = per_call_us(lambda: db.execute_query(sql, params), ITERATIONS // 4)
+    named_path = per_call_us(lambda: db.execute_query(statement, params), ITERATIONS // 4)
+    print(f"execute_query(sql)                 {raw_path:8.2f} us/次")
+    print(f"execute_query(预编译语句)          {named_path:8.2f} us/次   节省 {raw_path - named_path:6.2f} us ({(raw_path - named_path) / raw_path:.0%})")
+
+
+if __name__ == "__main__":
+    main()
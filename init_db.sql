@@ -23,17 +23,26 @@ CREATE TABLE IF NOT EXISTS users (
 INSERT INTO users (username, password, role, real_name, unit, email, is_active) 
 VALUES ('00000000', '$12$uKuX7r9e4s7gmuDK4tsaP.Lwcejmxrc606.KKOPs7vsE1O0TUsVxS', 'admin', '系统管理员','人计学院', 'admin@example.com', TRUE);
 
--- 用户操作日志表
+-- 用户操作日志表（按月分区，分区表不支持外键）
+-- 月度分区由 modules/log_retention.py 提前创建，过期分区归档后删除
 CREATE TABLE IF NOT EXISTS user_logs (
-    id INT PRIMARY KEY AUTO_INCREMENT,
+    id INT NOT NULL AUTO_INCREMENT,
     user_id INT NOT NULL,
     action VARCHAR(50) NOT NULL COMMENT '操作类型',
     details TEXT COMMENT '操作详情',
     ip_address VARCHAR(45) COMMENT 'IP地址',
     user_agent TEXT COMMENT '用户代理',
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at),
+    INDEX idx_user_id (user_id),
+    INDEX idx_created_at (created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+PARTITION BY RANGE (UNIX_TIMESTAMP(created_at)) (
+    PARTITION p_history VALUES LESS THAN (UNIX_TIMESTAMP('2026-10-01 00:00:00')),
+    PARTITION p202610 VALUES LESS THAN (UNIX_TIMESTAMP('2026-11-01 00:00:00')),
+    PARTITION p202611 VALUES LESS THAN (UNIX_TIMESTAMP('2026-12-01 00:00:00')),
+    PARTITION p_future VALUES LESS THAN MAXVALUE
+);
 
 -- 文件上传表
 CREATE TABLE IF NOT EXISTS files_uploads (
@@ -44,6 +53,11 @@ CREATE TABLE IF NOT EXISTS files_uploads (
     file_size INT NOT NULL COMMENT '文件大小(字节)',
     upload_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '上传时间',
     user_id INT NOT NULL,
+    phash CHAR(64) NULL COMMENT '感知哈希(dHash 256位)',
+    content_hash CHAR(64) NULL COMMENT '文件内容SHA-256(内容寻址存储键)',
+    INDEX idx_phash (phash),
+    INDEX idx_content_hash (content_hash),
+    INDEX idx_file_path (file_path),
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
@@ -60,11 +74,14 @@ CREATE TABLE IF NOT EXISTS certificate_records (
     organizing_unit VARCHAR(255) COMMENT '主办单位',
     award_date DATE COMMENT '获奖时间',
     advisor_name VARCHAR(50) NOT NULL COMMENT '指导教师',
+    advisor_user_id INT NULL COMMENT '指导教师用户ID',
     upload_file_id INT NOT NULL COMMENT '关联上传文件ID',
     user_id INT NOT NULL COMMENT '上传用户ID',
     status ENUM('draft', 'submitted') DEFAULT 'draft' COMMENT '状态',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    INDEX idx_advisor_user_id (advisor_user_id),
     FOREIGN KEY (upload_file_id) REFERENCES files_uploads(id) ON DELETE CASCADE,
-    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (advisor_user_id) REFERENCES users(id) ON DELETE SET NULL
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
\ No newline at end of file
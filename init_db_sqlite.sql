@@ -0,0 +1,87 @@
+-- SQLite 嵌入式模式建表脚本（与 init_db.sql 结构一致）
+-- ENUM 用 CHECK 约束代替，ON UPDATE CURRENT_TIMESTAMP 用触发器代替
+-- SQLite 不支持分区，user_logs 的保留策略按时间范围删除
+
+-- 用户表
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username VARCHAR(20) UNIQUE NOT NULL,
+    password VARCHAR(255) NOT NULL,
+    role VARCHAR(10) NOT NULL CHECK (role IN ('student', 'teacher', 'admin')),
+    real_name VARCHAR(50) NOT NULL,
+    unit VARCHAR(100),
+    email VARCHAR(100),
+    phone VARCHAR(20),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_login TIMESTAMP NULL,
+    is_active BOOLEAN DEFAULT TRUE
+);
+CREATE INDEX IF NOT EXISTS idx_username ON users (username);
+CREATE INDEX IF NOT EXISTS idx_role ON users (role);
+
+-- 创建默认管理员账户（密码：admin123）
+INSERT INTO users (username, password, role, real_name, unit, email, is_active)
+VALUES ('00000000', '$12$uKuX7r9e4s7gmuDK4tsaP.Lwcejmxrc606.KKOPs7vsE1O0TUsVxS', 'admin', '系统管理员','人计学院', 'admin@example.com', TRUE);
+
+-- 用户操作日志表
+CREATE TABLE IF NOT EXISTS user_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INT NOT NULL,
+    action VARCHAR(50) NOT NULL,
+    details TEXT,
+    ip_address VARCHAR(45),
+    user_agent TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_user_logs_user_id ON user_logs (user_id);
+CREATE INDEX IF NOT EXISTS idx_user_logs_created_at ON user_logs (created_at);
+
+-- 文件上传表
+CREATE TABLE IF NOT EXISTS files_uploads (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    filename VARCHAR(255) NOT NULL,
+    file_path VARCHAR(255) NOT NULL,
+    file_type VARCHAR(50) NOT NULL,
+    file_size INT NOT NULL,
+    upload_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    user_id INT NOT NULL,
+    phash CHAR(64) NULL,
+    content_hash CHAR(64) NULL,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_phash ON files_uploads (phash);
+CREATE INDEX IF NOT EXISTS idx_content_hash ON files_uploads (content_hash);
+CREATE INDEX IF NOT EXISTS idx_file_path ON files_uploads (file_path);
+
+-- 证书信息表
+CREATE TABLE IF NOT EXISTS certificate_records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    student_college VARCHAR(100),
+    competition_name VARCHAR(255),
+    student_id VARCHAR(20) NOT NULL,
+    student_name VARCHAR(50) NOT NULL,
+    award_category VARCHAR(20),
+    award_level VARCHAR(20),
+    competition_type VARCHAR(10),
+    organizing_unit VARCHAR(255),
+    award_date DATE,
+    advisor_name VARCHAR(50) NOT NULL,
+    advisor_user_id INT NULL,
+    upload_file_id INT NOT NULL,
+    user_id INT NOT NULL,
+    status VARCHAR(10) DEFAULT 'draft' CHECK (status IN ('draft', 'submitted')),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (upload_file_id) REFERENCES files_uploads(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (advisor_user_id) REFERENCES users(id) ON DELETE SET NULL
+);
+CREATE INDEX IF NOT EXISTS idx_advisor_user_id ON certificate_records (advisor_user_id);
+
+-- 模拟 MySQL 的 ON UPDATE CURRENT_TIMESTAMP
+CREATE TRIGGER IF NOT EXISTS trg_certificate_records_updated_at
+AFTER UPDATE ON certificate_records
+FOR EACH ROW WHEN NEW.updated_at = OLD.updated_at
+BEGIN
+    UPDATE certificate_records SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+END;
@@ -0,0 +1,20 @@
+-- 证书记录关联指导教师用户ID
+-- 教师查询改为按 advisor_user_id 走索引，不再按姓名子查询匹配
+USE cert_system;
+
+ALTER TABLE certificate_records
+    ADD COLUMN advisor_user_id INT NULL COMMENT '指导教师用户ID' AFTER advisor_name,
+    ADD INDEX idx_advisor_user_id (advisor_user_id),
+    ADD CONSTRAINT fk_cert_advisor_user FOREIGN KEY (advisor_user_id) REFERENCES users(id) ON DELETE SET NULL;
+
+-- 按姓名回填：只回填姓名唯一的教师，重名教师需人工确认
+UPDATE certificate_records cr
+JOIN (
+    SELECT real_name, MIN(id) AS id
+    FROM users
+    WHERE role = 'teacher'
+    GROUP BY real_name
+    HAVING COUNT(*) = 1
+) t ON t.real_name = cr.advisor_name
+SET cr.advisor_user_id = t.id
+WHERE cr.advisor_user_id IS NULL;
@@ -0,0 +1,22 @@
+-- 用户操作日志按月分区
+-- 分区表不支持外键，且分区键必须包含在所有唯一索引中，
+-- 因此去掉 user_id 外键，主键改为 (id, created_at)
+-- 此后的月度分区由 modules/log_retention.py 自动维护
+USE cert_system;
+
+-- 外键名为 MySQL 自动生成的名称，如有不同请先用 SHOW CREATE TABLE user_logs 确认
+ALTER TABLE user_logs DROP FOREIGN KEY user_logs_ibfk_1;
+
+ALTER TABLE user_logs
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (id, created_at),
+    ADD INDEX idx_user_id (user_id),
+    ADD INDEX idx_created_at (created_at);
+
+-- 迁移前的历史日志全部落在 p_history 分区，由保留任务归档后删除
+ALTER TABLE user_logs PARTITION BY RANGE (UNIX_TIMESTAMP(created_at)) (
+    PARTITION p_history VALUES LESS THAN (UNIX_TIMESTAMP('2026-10-01 00:00:00')),
+    PARTITION p202610 VALUES LESS THAN (UNIX_TIMESTAMP('2026-11-01 00:00:00')),
+    PARTITION p202611 VALUES LESS THAN (UNIX_TIMESTAMP('2026-12-01 00:00:00')),
+    PARTITION p_future VALUES LESS THAN MAXVALUE
+);
@@ -0,0 +1,8 @@
+-- 上传文件增加感知哈希，用于上传时检测近似重复的证书并复用已有提取结果
+-- 近似查询由 modules/phash_index.py 在进程内的 BK 树完成，索引用于精确重复查询和增量同步
+-- 历史文件不回填，只对迁移后的上传生效
+USE cert_system;
+
+ALTER TABLE files_uploads
+    ADD COLUMN phash CHAR(64) NULL COMMENT '感知哈希(dHash 256位)' AFTER user_id,
+    ADD INDEX idx_phash (phash);
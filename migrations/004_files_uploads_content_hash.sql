@@ -0,0 +1,9 @@
+-- 上传文件改为按内容寻址存储：uploads/ab/cd/<sha256><ext>，相同内容只保存一份
+-- files_uploads 每次上传仍保留一行元数据，content_hash 相同的行共用一个物理文件，
+-- 行数即该文件的引用计数（用户删除时级联删除行，计数随之减少）
+-- 迁移前的文件仍在 uploads/<uuid><ext>，content_hash 为 NULL，照常读取
+USE cert_system;
+
+ALTER TABLE files_uploads
+    ADD COLUMN content_hash CHAR(64) NULL COMMENT '文件内容SHA-256(内容寻址存储键)' AFTER phash,
+    ADD INDEX idx_content_hash (content_hash);
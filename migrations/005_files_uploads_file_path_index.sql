@@ -0,0 +1,6 @@
+-- 物理文件的引用计数按 file_path 统计：同一内容重新压缩后换了路径，content_hash 不再对应唯一的文件
+-- 删除物理文件前按路径查询引用它的记录数，需要索引
+USE cert_system;
+
+ALTER TABLE files_uploads
+    ADD INDEX idx_file_path (file_path);
@@ -201,6 +201,11 @@ class AuthSystem:
         
         st.session_state.authenticated = False
         st.session_state.user_info = None
+        # 清除上传页保存的处理状态（含已登记的上传记录）、编辑代理、方向检测和提取结果，
+        # 同一浏览器标签页中下一个登录的用户不会沿用
+        for key in ("upload_sessions", "proxy_editor", "proxy_editor_key", "auto_rotation",
+                    "extracted_info", "show_extracted_info"):
+            st.session_state.pop(key, None)
         st.success("已成功登出")
         st.rerun()
     
@@ -3,14 +3,18 @@ import base64
 import json
 import os
 import logging
+import threading
 
 # 设置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 智谱AI API 密钥：优先使用环境变量 ZHIPU_API_KEY（请修改为实际密钥）
+ZHIPU_API_KEY = os.getenv("ZHIPU_API_KEY", "869009c52642440daa5b791e2b3c61b7.FooxInR1ve4l4M7h")
+
 class CertificateExtractor:
     def __init__(self, api_key: str = None):
-        self.api_key = api_key or os.getenv("ZHIPU_API_KEY")
+        self.api_key = api_key or ZHIPU_API_KEY
         self.api_url = "https://open.bigmodel.cn/api/paas/v4/chat/completions"
         self.model = "glm-4.6v"
         
@@ -142,3 +146,42 @@ class CertificateExtractor:
             validated_data[field] = extracted_data.get(field, "")
         
         return validated_data
+    
+    # 提取字段与 certificate_records 列的对应关系
+    RECORD_FIELDS = {
+        "学生所在学院": "student_college",
+        "竞赛项目": "competition_name",
+        "学号": "student_id",
+        "学生姓名": "student_name",
+        "获奖类别": "award_category",
+        "获奖等级": "award_level",
+        "竞赛类型": "competition_type",
+        "主办单位": "organizing_unit",
+        "获奖时间": "award_date",
+        "指导教师": "advisor_name"
+    }
+    
+    @staticmethod
+    def record_to_extracted_data(record: dict) -> dict:
+        """
+        将已保存的证书记录还原为提取结果格式，用于复用重复证书的提取结果
+        :param record: certificate_records 中的一条记录
+        :return: 与 validate_extracted_data 相同格式的证书信息
+        """
+        return {
+            field: str(record.get(column) or "")
+            for field, column in CertificateExtractor.RECORD_FIELDS.items()
+        }
+
+
+_extractor = None
+_extractor_lock = threading.Lock()
+
+
+def get_extractor() -> CertificateExtractor:
+    """进程内共享的证书提取器，首次使用时按 ZHIPU_API_KEY 创建"""
+    global _extractor
+    with _extractor_lock:
+        if _extractor is None:
+            _extractor = CertificateExtractor()
+        return _extractor
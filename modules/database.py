@@ -1,14 +1,23 @@
 # modules/database.py
-import pymysql
-from sqlalchemy import create_engine, text
+import os
+from sqlalchemy import text, bindparam
+from sqlalchemy.sql.elements import TextClause
+from sqlalchemy.exc import OperationalError, InterfaceError
 from sqlalchemy.orm import sessionmaker, scoped_session
 from contextlib import contextmanager
+from contextvars import ContextVar
+import threading
+import time
 import bcrypt
 import logging
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Union
+from modules.db_backend import get_backend
 
 # 数据库配置
+# backend 可选 mysql（默认）或 sqlite（嵌入式模式，无需数据库服务，可用环境变量 CB_DB_BACKEND 切换）
 DB_CONFIG = {
+    'backend': os.getenv('CB_DB_BACKEND', 'mysql'),
+    'sqlite_path': os.getenv('CB_SQLITE_PATH', 'cert_system.db'),
     'host': 'localhost',
     'port': 3306,
     'user': 'root',
@@ -17,10 +26,87 @@ DB_CONFIG = {
     'charset': 'utf8mb4'
 }
 
+# 只读副本配置（可选），为 None 时所有读写都走主库
+# 格式与 DB_CONFIG 相同；也可以只提供 'url'，例如本地测试用 {'url': 'sqlite:///replica.db'}
+REPLICA_CONFIG = None
+
+# 会话写入后多少秒内的读请求仍走主库，避免读到复制延迟前的旧数据
+READ_YOUR_WRITES_SECONDS = 5
+
+# 预编译语句：高频、结构固定的SQL在初始化时构建一次，调用方按名称引用
+# {now} 等占位符在初始化时由数据库后端替换为对应方言
+STATEMENTS = {
+    'user_exists': "SELECT COUNT(*) as count FROM users WHERE username = :username",
+    'verify_user': """
+        SELECT id, username, password, role, real_name, unit, email, is_active
+        FROM users 
+        WHERE username = :username AND is_active = TRUE
+    """,
+    'update_last_login': "UPDATE users SET last_login = {now} WHERE id = :id",
+    'get_user_by_id': "SELECT id, username, role, real_name, unit, email, phone, created_at, last_login, is_active FROM users WHERE id = :id",
+    'update_user_status': "UPDATE users SET is_active = :is_active WHERE id = :id",
+    'reset_user_password': "UPDATE users SET password = :password WHERE id = :id",
+    'log_user_action': """
+        INSERT INTO user_logs (user_id, action, details, ip_address, user_agent)
+        VALUES (:user_id, :action, :details, :ip_address, :user_agent)
+    """,
+    'get_user_files': """
+        SELECT id, filename, file_path, file_type, file_size, upload_time
+        FROM files_uploads
+        WHERE user_id = :user_id
+        ORDER BY upload_time DESC
+    """,
+    'get_file_by_id': """
+        SELECT id, filename, file_path, file_type, file_size, upload_time, user_id
+        FROM files_uploads
+        WHERE id = :file_id
+    """,
+    'certificates_by_student_user': """
+        SELECT cr.*, fu.filename, fu.file_path, fu.file_type
+        FROM certificate_records cr
+        LEFT JOIN files_uploads fu ON cr.upload_file_id = fu.id
+        WHERE cr.student_id = (SELECT username FROM users WHERE id = :user_id)
+        ORDER BY cr.id DESC
+    """,
+    'certificates_by_advisor': """
+        SELECT cr.*, fu.filename, fu.file_path, fu.file_type
+        FROM certificate_records cr
+        LEFT JOIN files_uploads fu ON cr.upload_file_id = fu.id
+        WHERE cr.advisor_user_id = :user_id
+        ORDER BY cr.id DESC
+    """,
+    'certificates_by_username': """
+        SELECT cr.*, fu.filename, fu.file_path, fu.file_type
+        FROM certificate_records cr
+        LEFT JOIN files_uploads fu ON cr.upload_file_id = fu.id
+        WHERE cr.student_id = :username
+        ORDER BY cr.id DESC
+    """,
+    'resolve_advisor_user_id': "SELECT id FROM users WHERE role = 'teacher' AND real_name = :real_name LIMIT 2",
+    'count_file_references': "SELECT COUNT(*) AS count FROM files_uploads WHERE file_path = :file_path",
+    'stored_file_by_hash': """
+        SELECT file_path, file_type, file_size
+        FROM files_uploads
+        WHERE content_hash = :content_hash
+        ORDER BY id DESC
+        LIMIT 1
+    """,
+    'file_hashes_since': """
+        SELECT id, phash
+        FROM files_uploads
+        WHERE id > :last_id AND phash IS NOT NULL
+        ORDER BY id
+    """,
+}
+
 # 设置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 当前请求所属的会话标识，由 bind_session 设置
+_session_key: ContextVar[Optional[str]] = ContextVar('db_session_key', default=None)
+
+
 class Database:
     _instance = None
     
@@ -33,23 +119,34 @@ class Database:
     def _initialize(self):
         """初始化数据库连接"""
         try:
+            # 数据库后端（方言相关的SQL由后端提供）
+            self.backend = get_backend(DB_CONFIG)
+            
             # 创建SQLAlchemy引擎
-            connection_string = f"mysql+pymysql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}"
-            self.engine = create_engine(
-                connection_string,
-                pool_size=10,
-                max_overflow=20,
-                pool_pre_ping=True,
-                echo=False
-            )
+            self.engine = self.backend.create_engine(DB_CONFIG)
+            self.backend.initialize_schema(self.engine)
+            
+            # 构建预编译语句
+            self.statements = self._build_statements()
             
             # 创建session工厂
             self.SessionFactory = sessionmaker(bind=self.engine)
             self.Session = scoped_session(self.SessionFactory)
             
+            # 只读副本（可选）
+            self.replica_engine = None
+            self.ReplicaSession = None
+            if REPLICA_CONFIG:
+                self.replica_engine = get_backend(REPLICA_CONFIG).create_engine(REPLICA_CONFIG)
+                self.ReplicaSession = scoped_session(sessionmaker(bind=self.replica_engine))
+            
+            # 各会话最近一次写入的时间
+            self._last_write = {}
+            self._last_write_lock = threading.Lock()
+            
             # 测试连接
             self.test_connection()
-            logger.info("数据库连接成功")
+            logger.info(f"数据库连接成功（{self.backend.name}）")
             
         except Exception as e:
             logger.error(f"数据库连接失败: {e}")
@@ -59,11 +156,56 @@ class Database:
         """测试数据库连接"""
         with self.engine.connect() as conn:
             conn.execute(text("SELECT 1"))
+        if self.replica_engine is not None:
+            with self.replica_engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+    
+    def _build_statements(self) -> Dict[str, TextClause]:
+        """按当前后端的方言构建预编译语句"""
+        dialect_values = {'now': self.backend.now()}
+        return {name: text(sql.format(**dialect_values)) for name, sql in STATEMENTS.items()}
+    
+    def bind_session(self, session_key: Optional[str]):
+        """绑定当前请求所属的会话，读写路由按会话区分"""
+        _session_key.set(session_key)
+    
+    def _current_session_key(self) -> str:
+        """当前会话标识，未绑定时按线程区分"""
+        return _session_key.get() or f"thread-{threading.get_ident()}"
+    
+    def _mark_write(self):
+        """记录当前会话的写入时间，同时清理已超出读己之写窗口的会话，记录数不随会话总数增长"""
+        now = time.monotonic()
+        with self._last_write_lock:
+            expired = [key for key, last_write in self._last_write.items()
+                       if now - last_write > READ_YOUR_WRITES_SECONDS]
+            for key in expired:
+                del self._last_write[key]
+            self._last_write[self._current_session_key()] = now
+    
+    def _should_use_replica(self) -> bool:
+        """读请求路由策略：配置了副本且当前会话最近没有写入时走副本"""
+        if self.ReplicaSession is None:
+            return False
+        
+        with self._last_write_lock:
+            last_write = self._last_write.get(self._current_session_key())
+        
+        return last_write is None or time.monotonic() - last_write > READ_YOUR_WRITES_SECONDS
+    
+    def _replica_available(self) -> bool:
+        """副本能否正常执行查询，用于区分副本故障和SQL错误"""
+        try:
+            with self.replica_engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            return True
+        except Exception:
+            return False
     
     @contextmanager
-    def get_session(self):
+    def get_session(self, use_replica: bool = False):
         """获取数据库session的上下文管理器"""
-        session = self.Session()
+        session = self.ReplicaSession() if use_replica and self.ReplicaSession else self.Session()
         try:
             yield session
             session.commit()
@@ -74,38 +216,84 @@ class Database:
         finally:
             session.close()
     
-    def execute_query(self, query: str, params: Optional[Dict] = None) -> List[Dict]:
-        """执行查询语句"""
+    def _as_statement(self, query: Union[str, TextClause]) -> TextClause:
+        """原始SQL字符串包装为 text()，预编译语句直接复用"""
+        return text(query) if isinstance(query, str) else query
+    
+    def execute_query(self, query: Union[str, TextClause], params: Optional[Dict] = None,
+                      use_replica: Optional[bool] = None) -> List[Dict]:
+        """执行查询语句
+        :param query: SQL字符串或 self.statements 中的预编译语句
+        :param use_replica: 是否走只读副本，为 None 时按会话写入情况自动路由
+        """
+        statement = self._as_statement(query)
+        if use_replica is None:
+            use_replica = self._should_use_replica()
+        
+        if use_replica and self.ReplicaSession is not None:
+            try:
+                with self.get_session(use_replica=True) as session:
+                    result = session.execute(statement, params or {})
+                    return [dict(row._mapping) for row in result]
+            except (OperationalError, InterfaceError) as e:
+                # 只在副本本身不可用时回退到主库；SQL 本身的错误（部分驱动同样报 OperationalError）
+                # 在主库上也会失败，不重复执行
+                if self._replica_available():
+                    logger.error(f"查询执行失败: {e}")
+                    return []
+                logger.warning(f"只读副本不可用，回退到主库: {e}")
+            except Exception as e:
+                logger.error(f"查询执行失败: {e}")
+                return []
+        
         try:
             with self.get_session() as session:
-                result = session.execute(text(query), params or {})
+                result = session.execute(statement, params or {})
                 return [dict(row._mapping) for row in result]
         except Exception as e:
             logger.error(f"查询执行失败: {e}")
             return []
     
-    def execute_update(self, query: str, params: Optional[Dict] = None) -> int:
+    def explain_query(self, query: str, params: Optional[Dict] = None) -> List[Dict]:
+        """获取查询计划，便于对比不同后端的执行方式"""
+        return self.execute_query(self.backend.explain(query), params, use_replica=False)
+    
+    def execute_update(self, query: Union[str, TextClause], params: Optional[Dict] = None) -> int:
         """执行更新语句，返回影响的行数"""
+        statement = self._as_statement(query)
+        self._mark_write()
         try:
             with self.get_session() as session:
-                result = session.execute(text(query), params or {})
+                result = session.execute(statement, params or {})
                 session.commit()
                 return result.rowcount
         except Exception as e:
             logger.error(f"更新执行失败: {e}")
             return 0
     
-    def user_exists(self, username: str) -> bool:
+    def execute_insert(self, query: Union[str, TextClause], params: Optional[Dict] = None) -> Optional[int]:
+        """执行插入语句，返回新记录的自增ID，失败时返回None"""
+        statement = self._as_statement(query)
+        self._mark_write()
+        try:
+            with self.get_session() as session:
+                result = session.execute(statement, params or {})
+                session.commit()
+                return result.lastrowid
+        except Exception as e:
+            logger.error(f"插入执行失败: {e}")
+            return None
+    
+    def user_exists(self, username: str, use_replica: Optional[bool] = None) -> bool:
         """检查用户是否存在"""
-        query = "SELECT COUNT(*) as count FROM users WHERE username = :username"
-        result = self.execute_query(query, {'username': username})
+        result = self.execute_query(self.statements['user_exists'], {'username': username}, use_replica=use_replica)
         return result[0]['count'] > 0 if result else False
     
     def create_user(self, user_data: Dict[str, Any]) -> bool:
         """创建新用户"""
         try:
-            # 检查用户名是否已存在
-            if self.user_exists(user_data['username']):
+            # 检查用户名是否已存在（唯一性检查必须读主库）
+            if self.user_exists(user_data['username'], use_replica=False):
                 return False
             
             # 加密密码
@@ -139,13 +327,7 @@ class Database:
     def verify_user(self, username: str, password: str) -> Optional[Dict]:
         """验证用户登录"""
         try:
-            query = """
-            SELECT id, username, password, role, real_name, unit, email, is_active
-            FROM users 
-            WHERE username = :username AND is_active = TRUE
-            """
-            
-            result = self.execute_query(query, {'username': username})
+            result = self.execute_query(self.statements['verify_user'], {'username': username})
             
             if not result:
                 return None
@@ -158,8 +340,7 @@ class Database:
                 del user['password']
                 
                 # 更新最后登录时间
-                update_query = "UPDATE users SET last_login = NOW() WHERE id = :id"
-                self.execute_update(update_query, {'id': user['id']})
+                self.execute_update(self.statements['update_last_login'], {'id': user['id']})
                 
                 return user
             
@@ -186,10 +367,9 @@ class Database:
             logger.error(f"获取用户列表失败: {e}")
             return []
     
-    def get_user_by_id(self, user_id: int) -> Optional[Dict]:
+    def get_user_by_id(self, user_id: int, use_replica: Optional[bool] = None) -> Optional[Dict]:
         """根据ID获取用户信息"""
-        query = "SELECT id, username, role, real_name, unit, email, phone, created_at, last_login, is_active FROM users WHERE id = :id"
-        result = self.execute_query(query, {'id': user_id})
+        result = self.execute_query(self.statements['get_user_by_id'], {'id': user_id}, use_replica=use_replica)
         return result[0] if result else None
     
     def update_user(self, user_id: int, user_data: Dict[str, Any]) -> bool:
@@ -226,8 +406,7 @@ class Database:
                 bcrypt.gensalt()
             ).decode('utf-8')
             
-            query = "UPDATE users SET password = :password WHERE id = :id"
-            return self.execute_update(query, {'id': user_id, 'password': hashed_password}) > 0
+            return self.execute_update(self.statements['reset_user_password'], {'id': user_id, 'password': hashed_password}) > 0
             
         except Exception as e:
             logger.error(f"重置用户密码失败: {e}")
@@ -236,15 +415,14 @@ class Database:
     def toggle_user_status(self, user_id: int) -> bool:
         """切换用户状态（启用/禁用）"""
         try:
-            # 先获取当前状态
-            user = self.get_user_by_id(user_id)
+            # 先获取当前状态（读后写，必须读主库）
+            user = self.get_user_by_id(user_id, use_replica=False)
             if not user:
                 return False
             
             # 切换状态
             new_status = not user['is_active']
-            query = "UPDATE users SET is_active = :is_active WHERE id = :id"
-            return self.execute_update(query, {'id': user_id, 'is_active': new_status}) > 0
+            return self.execute_update(self.statements['update_user_status'], {'id': user_id, 'is_active': new_status}) > 0
             
         except Exception as e:
             logger.error(f"切换用户状态失败: {e}")
@@ -252,8 +430,7 @@ class Database:
     
     def update_user_status(self, user_id: int, is_active: bool) -> bool:
         """更新用户状态"""
-        query = "UPDATE users SET is_active = :is_active WHERE id = :id"
-        return self.execute_update(query, {'id': user_id, 'is_active': is_active}) > 0
+        return self.execute_update(self.statements['update_user_status'], {'id': user_id, 'is_active': is_active}) > 0
     
     def update_user_info(self, user_id: int, update_data: Dict[str, Any]) -> bool:
         """更新用户信息"""
@@ -292,8 +469,7 @@ class Database:
                 bcrypt.gensalt()
             ).decode('utf-8')
             
-            query = "UPDATE users SET password = :password WHERE id = :id"
-            return self.execute_update(query, {'id': user_id, 'password': hashed_password}) > 0
+            return self.execute_update(self.statements['reset_user_password'], {'id': user_id, 'password': hashed_password}) > 0
             
         except Exception as e:
             logger.error(f"重置用户密码失败: {e}")
@@ -302,11 +478,6 @@ class Database:
     def log_user_action(self, user_id: int, action: str, details: str = '', 
                        ip_address: str = '', user_agent: str = ''):
         """记录用户操作日志"""
-        query = """
-        INSERT INTO user_logs (user_id, action, details, ip_address, user_agent)
-        VALUES (:user_id, :action, :details, :ip_address, :user_agent)
-        """
-        
         params = {
             'user_id': user_id,
             'action': action,
@@ -315,14 +486,53 @@ class Database:
             'user_agent': user_agent
         }
         
-        self.execute_update(query, params)
+        self.execute_update(self.statements['log_user_action'], params)
+    
+    def get_recent_activity(self, limit: int = 20, cursor: Optional[Dict] = None,
+                            days: int = 30) -> List[Dict]:
+        """分页获取最近的用户操作日志
+        :param limit: 每页条数
+        :param cursor: 上一页最后一条记录的 {'created_at', 'id'}，为空时取第一页
+        :param days: 只查询最近多少天的日志，用于分区裁剪
+        :return: 日志记录列表（按时间倒序）
+        """
+        try:
+            # created_at 范围条件让查询只落在最近的分区上，游标分页避免 OFFSET 扫描
+            query = f"""
+            SELECT ul.id, ul.user_id, ul.action, ul.details, ul.created_at,
+                   u.username, u.real_name
+            FROM user_logs ul
+            LEFT JOIN users u ON ul.user_id = u.id
+            WHERE ul.created_at >= {self.backend.days_ago('days')}
+            """
+            params = {'days': days, 'limit': limit}
+            
+            if cursor:
+                query += """
+                AND (ul.created_at < :cursor_time
+                     OR (ul.created_at = :cursor_time AND ul.id < :cursor_id))
+                """
+                params['cursor_time'] = cursor['created_at']
+                params['cursor_id'] = cursor['id']
+            
+            query += " ORDER BY ul.created_at DESC, ul.id DESC LIMIT :limit"
+            
+            return self.execute_query(query, params)
+        except Exception as e:
+            logger.error(f"获取最近活动失败: {e}")
+            return []
     
-    def save_uploaded_file(self, filename: str, file_path: str, file_type: str, 
-                          file_size: int, user_id: int) -> bool:
-        """保存上传文件信息到数据库"""
+    def register_uploaded_file(self, filename: str, file_path: str, file_type: str,
+                               file_size: int, user_id: int, phash: Optional[str] = None,
+                               content_hash: Optional[str] = None) -> Optional[int]:
+        """保存上传文件信息到数据库
+        :param phash: 图片（PDF为首页）的感知哈希，用于近似重复检测
+        :param content_hash: 文件内容的 SHA-256，即内容寻址存储的键；同一内容的记录共用一个物理文件
+        :return: 新记录的文件ID，失败时返回None
+        """
         query = """
-        INSERT INTO files_uploads (filename, file_path, file_type, file_size, user_id)
-        VALUES (:filename, :file_path, :file_type, :file_size, :user_id)
+        INSERT INTO files_uploads (filename, file_path, file_type, file_size, user_id, phash, content_hash)
+        VALUES (:filename, :file_path, :file_type, :file_size, :user_id, :phash, :content_hash)
         """
         
         params = {
@@ -330,31 +540,65 @@ class Database:
             'file_path': file_path,
             'file_type': file_type,
             'file_size': file_size,
-            'user_id': user_id
+            'user_id': user_id,
+            'phash': phash,
+            'content_hash': content_hash
         }
         
-        return self.execute_update(query, params) > 0
+        return self.execute_insert(query, params)
     
-    def get_user_files(self, user_id: int) -> list:
-        """获取用户的所有上传文件"""
-        query = """
-        SELECT id, filename, file_path, file_type, file_size, upload_time
-        FROM files_uploads
-        WHERE user_id = :user_id
-        ORDER BY upload_time DESC
+    def count_file_references(self, file_path: str) -> int:
+        """
+        引用同一物理文件的上传记录数，为 0 时物理文件可以删除
+        用于删除文件前的判断，查询失败时抛出异常而不是返回 0（读主库）
+        """
+        with self.get_session() as session:
+            result = session.execute(self.statements['count_file_references'], {'file_path': file_path})
+            return result.scalar()
+    
+    def get_stored_file(self, content_hash: str) -> Optional[Dict]:
         """
+        按上传内容的哈希查找已保存的物理文件（读主库）
+        重新压缩后的文件换了路径和格式，但记录仍保留上传时的 content_hash，同一内容再次上传时复用该文件
+        :return: 含 file_path、file_type、file_size 的字典，没有记录时返回None
+        """
+        result = self.execute_query(self.statements['stored_file_by_hash'], {'content_hash': content_hash},
+                                    use_replica=False)
+        return result[0] if result else None
+    
+    def get_file_hashes_since(self, last_id: int) -> List[Dict]:
+        """获取ID大于 last_id 且有感知哈希的上传文件，供近似重复索引增量同步"""
+        return self.execute_query(self.statements['file_hashes_since'], {'last_id': last_id})
+    
+    def get_certificate_by_files(self, file_ids: List[int]) -> Optional[Dict]:
+        """获取关联到给定上传文件的证书记录，按 file_ids 的顺序取第一个有记录的文件的最新一条
+        :param file_ids: 上传文件ID列表（通常按相似度排序）
+        :return: 证书记录，都没有时返回None
+        """
+        if not file_ids:
+            return None
         
-        return self.execute_query(query, {'user_id': user_id})
+        query = text("""
+        SELECT *
+        FROM certificate_records
+        WHERE upload_file_id IN :file_ids
+        ORDER BY id DESC
+        """).bindparams(bindparam('file_ids', expanding=True))
+        
+        records = self.execute_query(query, {'file_ids': list(file_ids)})
+        for file_id in file_ids:
+            for record in records:
+                if record['upload_file_id'] == file_id:
+                    return record
+        return None
+    
+    def get_user_files(self, user_id: int) -> list:
+        """获取用户的所有上传文件"""
+        return self.execute_query(self.statements['get_user_files'], {'user_id': user_id})
     
     def get_file_by_id(self, file_id: int) -> dict:
         """根据ID获取文件信息"""
-        query = """
-        SELECT id, filename, file_path, file_type, file_size, upload_time, user_id
-        FROM files_uploads
-        WHERE id = :file_id
-        """
-        
-        result = self.execute_query(query, {'file_id': file_id})
+        result = self.execute_query(self.statements['get_file_by_id'], {'file_id': file_id})
         return result[0] if result else None
     
     def get_user_certificates(self, user_id: int, role: str) -> List[Dict]:
@@ -366,24 +610,12 @@ class Database:
         try:
             if role == 'student':
                 # 学生：获取自己的证书记录
-                query = """
-                SELECT cr.*, fu.filename, fu.file_path, fu.file_type
-                FROM certificate_records cr
-                LEFT JOIN files_uploads fu ON cr.upload_file_id = fu.id
-                WHERE cr.student_id = (SELECT username FROM users WHERE id = :user_id)
-                ORDER BY cr.id DESC
-                """
+                statement = self.statements['certificates_by_student_user']
             else:  # teacher
                 # 教师：获取自己指导的学生的证书记录
-                query = """
-                SELECT cr.*, fu.filename, fu.file_path, fu.file_type
-                FROM certificate_records cr
-                LEFT JOIN files_uploads fu ON cr.upload_file_id = fu.id
-                WHERE cr.advisor_name = (SELECT real_name FROM users WHERE id = :user_id)
-                ORDER BY cr.id DESC
-                """
+                statement = self.statements['certificates_by_advisor']
             
-            return self.execute_query(query, {'user_id': user_id})
+            return self.execute_query(statement, {'user_id': user_id})
         except Exception as e:
             logger.error(f"获取证书记录失败: {e}")
             return []
@@ -394,24 +626,29 @@ class Database:
         :return: 证书记录列表
         """
         try:
-            query = """
-            SELECT cr.*, fu.filename, fu.file_path, fu.file_type
-            FROM certificate_records cr
-            LEFT JOIN files_uploads fu ON cr.upload_file_id = fu.id
-            WHERE cr.student_id = :username
-            ORDER BY cr.id DESC
-            """
-            
-            return self.execute_query(query, {'username': username})
+            return self.execute_query(self.statements['certificates_by_username'], {'username': username})
         except Exception as e:
             logger.error(f"根据用户名获取证书记录失败: {e}")
             return []
     
+    def resolve_advisor_user_id(self, advisor_name: str) -> Optional[int]:
+        """根据指导教师姓名查找教师用户ID
+        :param advisor_name: 指导教师姓名
+        :return: 姓名唯一匹配时返回教师ID，否则返回None
+        """
+        if not advisor_name:
+            return None
+        
+        result = self.execute_query(self.statements['resolve_advisor_user_id'], {'real_name': advisor_name})
+        # 重名教师无法确定归属，不自动关联
+        return result[0]['id'] if len(result) == 1 else None
+    
     def save_certificate_record(self, student_college: str, competition_name: str, 
                                student_id: str, student_name: str, award_category: str, 
                                award_level: str, competition_type: str, organizing_unit: str, 
                                award_date: str, advisor_name: str, upload_file_id: int, 
-                               user_id: int, status: str = 'draft') -> bool:
+                               user_id: int, status: str = 'draft',
+                               advisor_user_id: Optional[int] = None) -> bool:
         """
         保存证书信息记录到数据库
         :param student_college: 学生所在学院
@@ -427,6 +664,7 @@ class Database:
         :param upload_file_id: 关联的上传文件ID
         :param user_id: 操作用户ID
         :param status: 状态（draft/submitted）
+        :param advisor_user_id: 指导教师用户ID，为空时按姓名匹配
         :return: 是否保存成功
         """
         try:
@@ -437,15 +675,18 @@ class Database:
             if award_date and not re.match(date_pattern, award_date):
                 award_date = None
             
+            if advisor_user_id is None:
+                advisor_user_id = self.resolve_advisor_user_id(advisor_name)
+            
             query = """
             INSERT INTO certificate_records (
                 student_college, competition_name, student_id, student_name, 
                 award_category, award_level, competition_type, organizing_unit, 
-                award_date, advisor_name, upload_file_id, user_id, status
+                award_date, advisor_name, advisor_user_id, upload_file_id, user_id, status
             ) VALUES (
                 :student_college, :competition_name, :student_id, :student_name, 
                 :award_category, :award_level, :competition_type, :organizing_unit, 
-                :award_date, :advisor_name, :upload_file_id, :user_id, :status
+                :award_date, :advisor_name, :advisor_user_id, :upload_file_id, :user_id, :status
             )
             """
             
@@ -460,6 +701,7 @@ class Database:
                 'organizing_unit': organizing_unit,
                 'award_date': award_date,
                 'advisor_name': advisor_name,
+                'advisor_user_id': advisor_user_id,
                 'upload_file_id': upload_file_id,
                 'user_id': user_id,
                 'status': status
@@ -476,7 +718,8 @@ class Database:
     def update_certificate(self, cert_id: int, student_id: str, student_name: str, 
                           student_college: str, competition_name: str, award_category: str, 
                           award_level: str, competition_type: str, organizing_unit: str, 
-                          award_date: str, advisor_name: str) -> bool:
+                          award_date: str, advisor_name: str,
+                          advisor_user_id: Optional[int] = None) -> bool:
         """
         更新证书信息
         :param cert_id: 证书ID
@@ -490,6 +733,7 @@ class Database:
         :param organizing_unit: 主办单位
         :param award_date: 获奖时间
         :param advisor_name: 指导教师
+        :param advisor_user_id: 指导教师用户ID，为空时按姓名匹配
         :return: 是否更新成功
         """
         try:
@@ -500,7 +744,10 @@ class Database:
             if award_date and not re.match(date_pattern, award_date):
                 award_date = None
             
-            query = """
+            if advisor_user_id is None:
+                advisor_user_id = self.resolve_advisor_user_id(advisor_name)
+            
+            query = f"""
             UPDATE certificate_records SET 
                 student_id = :student_id, 
                 student_name = :student_name, 
@@ -512,7 +759,8 @@ class Database:
                 organizing_unit = :organizing_unit, 
                 award_date = :award_date, 
                 advisor_name = :advisor_name,
-                updated_at = NOW()
+                advisor_user_id = :advisor_user_id,
+                updated_at = {self.backend.now()}
             WHERE id = :cert_id AND status = 'draft'  -- 只允许更新草稿状态的证书
             """
             
@@ -527,7 +775,8 @@ class Database:
                 'competition_type': competition_type,
                 'organizing_unit': organizing_unit,
                 'award_date': award_date,
-                'advisor_name': advisor_name
+                'advisor_name': advisor_name,
+                'advisor_user_id': advisor_user_id
             }
             
             logger.info(f"准备更新证书记录，参数: {params}")
@@ -545,10 +794,10 @@ class Database:
         :return: 是否提交成功
         """
         try:
-            query = """
+            query = f"""
             UPDATE certificate_records SET 
                 status = 'submitted',
-                updated_at = NOW()
+                updated_at = {self.backend.now()}
             WHERE id = :cert_id AND status = 'draft'  -- 只允许提交草稿状态的证书
             """
             
@@ -0,0 +1,147 @@
+# modules/db_backend.py
+import os
+import logging
+from typing import Dict
+from sqlalchemy import create_engine, event
+
+# 设置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 项目根目录，用于定位建表脚本
+project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 驱动层已准备语句缓存大小（仅对支持的驱动生效）
+PREPARED_STATEMENT_CACHE_SIZE = 256
+
+
+class DatabaseBackend:
+    """数据库后端：封装连接方式和方言相关的SQL片段"""
+
+    name = ""
+    # 建表脚本
+    schema_file = ""
+    # 是否支持表分区（user_logs 按月分区）
+    supports_partitioning = False
+
+    def connection_string(self, config: Dict) -> str:
+        """根据配置生成连接串"""
+        raise NotImplementedError
+
+    def create_engine(self, config: Dict):
+        """创建SQLAlchemy引擎"""
+        raise NotImplementedError
+
+    def now(self) -> str:
+        """当前时间"""
+        return "CURRENT_TIMESTAMP"
+
+    def days_ago(self, param: str) -> str:
+        """当前时间往前推 :param 天"""
+        raise NotImplementedError
+
+    def explain(self, query: str) -> str:
+        """查询计划语句"""
+        raise NotImplementedError
+
+    def initialize_schema(self, engine):
+        """按需创建表结构，默认不处理（MySQL 由 init_db.sql 手工初始化）"""
+        pass
+
+
+class MySQLBackend(DatabaseBackend):
+    """MySQL 后端（生产环境）"""
+
+    name = "mysql"
+    schema_file = os.path.join(project_dir, "init_db.sql")
+    supports_partitioning = True
+
+    def connection_string(self, config: Dict) -> str:
+        return f"mysql+pymysql://{config['user']}:{config['password']}@{config['host']}:{config['port']}/{config['database']}"
+
+    def create_engine(self, config: Dict):
+        # pymysql 不支持服务端预处理语句，语句复用只在 SQLAlchemy 编译缓存层面生效
+        return create_engine(
+            config.get('url') or self.connection_string(config),
+            pool_size=10,
+            max_overflow=20,
+            pool_pre_ping=True,
+            echo=False
+        )
+
+    def now(self) -> str:
+        return "NOW()"
+
+    def days_ago(self, param: str) -> str:
+        return f"NOW() - INTERVAL :{param} DAY"
+
+    def explain(self, query: str) -> str:
+        return f"EXPLAIN {query}"
+
+
+class SQLiteBackend(DatabaseBackend):
+    """SQLite 嵌入式后端（本地开发、CI、基准测试，无需数据库服务）"""
+
+    name = "sqlite"
+    schema_file = os.path.join(project_dir, "init_db_sqlite.sql")
+    supports_partitioning = False
+
+    def connection_string(self, config: Dict) -> str:
+        return f"sqlite:///{config.get('sqlite_path', 'cert_system.db')}"
+
+    def create_engine(self, config: Dict):
+        engine = create_engine(
+            config.get('url') or self.connection_string(config),
+            # Streamlit 每个会话在独立线程中运行；
+            # cached_statements 为 sqlite3 每个连接缓存的已准备语句数量，预编译语句可直接命中
+            connect_args={'check_same_thread': False, 'cached_statements': PREPARED_STATEMENT_CACHE_SIZE},
+            echo=False
+        )
+
+        @event.listens_for(engine, "connect")
+        def _set_sqlite_pragma(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            # SQLite 默认不检查外键
+            cursor.execute("PRAGMA foreign_keys = ON")
+            # WAL 模式下读写互不阻塞
+            cursor.execute("PRAGMA journal_mode = WAL")
+            cursor.close()
+
+        return engine
+
+    def days_ago(self, param: str) -> str:
+        return f"datetime('now', '-' || :{param} || ' days')"
+
+    def explain(self, query: str) -> str:
+        return f"EXPLAIN QUERY PLAN {query}"
+
+    def initialize_schema(self, engine):
+        """数据库文件为空时执行建表脚本"""
+        raw_connection = engine.raw_connection()
+        try:
+            cursor = raw_connection.cursor()
+            cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'users'")
+            if cursor.fetchone()[0] == 0:
+                with open(self.schema_file, "r", encoding="utf-8") as f:
+                    raw_connection.driver_connection.executescript(f.read())
+                logger.info(f"已初始化SQLite数据库结构: {self.schema_file}")
+            cursor.close()
+        finally:
+            raw_connection.close()
+
+
+BACKENDS = {
+    MySQLBackend.name: MySQLBackend,
+    SQLiteBackend.name: SQLiteBackend
+}
+
+
+def get_backend(config: Dict) -> DatabaseBackend:
+    """根据配置选择后端；配置了 url 时按 url 前缀判断"""
+    name = config.get('backend', MySQLBackend.name)
+    if config.get('url'):
+        name = SQLiteBackend.name if config['url'].startswith('sqlite') else MySQLBackend.name
+
+    if name not in BACKENDS:
+        raise ValueError(f"不支持的数据库后端: {name}")
+    return BACKENDS[name]()
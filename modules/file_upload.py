@@ -1,47 +1,214 @@
 import os
-import uuid
+import hashlib
+import tempfile
 import streamlit as st
 from datetime import datetime
+from typing import Optional
+from modules.database import db
+from modules.file_validator import FileValidator, EXTENSION_TYPES, TYPE_EXTENSIONS
+
+# 上传文件大小上限
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+# 流式读取的块大小：单次上传在处理过程中只占用一个块的内存
+INGEST_CHUNK_SIZE = 1024 * 1024
+
 
 class FileUploader:
     def __init__(self, upload_dir: str = "uploads"):
         self.upload_dir = upload_dir
+        # 写入中的临时文件，与正式文件在同一文件系统上，重命名是原子操作
+        self.incoming_dir = os.path.join(upload_dir, ".incoming")
         os.makedirs(upload_dir, exist_ok=True)
     
-    def save_file(self, uploaded_file, user_id: int) -> dict:
+    def ingest(self, uploaded_file, validator: FileValidator = None, max_size: int = MAX_UPLOAD_SIZE) -> dict:
+        """
+        流式接收上传文件：按块读取一遍，同时计算哈希、校验文件头、检查大小并写入临时文件，
+        完成后按内容哈希原子地重命名到正式路径（内容已存在时丢弃临时文件，复用已保存的文件）
+        :param uploaded_file: Streamlit 上传的文件对象
+        :param validator: 文件校验器，第一块读入后即校验魔数和图片尺寸，不合格时不再继续读取
+        :param max_size: 文件大小上限（字节），超过时立即停止读取
+        :return: 文件信息（含 file_path、content_hash、header_info，以及保存的文件的 file_type、stored_size，
+                 复用已重新压缩的文件时与上传的格式和大小不同），被拒绝时含 error；读取失败返回None
+        """
+        validator = validator or FileValidator()
+        file_ext = os.path.splitext(uploaded_file.name)[1].lower()
+        file_info = {
+            "filename": uploaded_file.name,
+            "file_ext": file_ext,
+            "file_size": 0,
+            "content_hash": None,
+            "file_path": None,
+            "file_type": file_ext[1:],
+            "stored_size": 0,
+            "header_info": {},
+            "error": ""
+        }
+        if file_ext not in EXTENSION_TYPES:
+            file_info["error"] = f"不支持的文件类型: {file_ext}"
+            return file_info
+        
+        temp_path = None
         try:
-            file_ext = os.path.splitext(uploaded_file.name)[1].lower()
-            file_size = len(uploaded_file.getvalue())
+            os.makedirs(self.incoming_dir, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.incoming_dir, suffix=".tmp")
+            sha256 = hashlib.sha256()
+            header = b""
+            
+            uploaded_file.seek(0)
+            with os.fdopen(fd, "wb") as f:
+                for chunk in iter(lambda: uploaded_file.read(INGEST_CHUNK_SIZE), b""):
+                    if not header:
+                        header = chunk
+                        is_valid, error_msg, file_info["header_info"] = validator.validate_header(header, file_ext)
+                        if not is_valid:
+                            file_info["error"] = error_msg
+                            break
+                    file_info["file_size"] += len(chunk)
+                    if file_info["file_size"] > max_size:
+                        file_info["error"] = f"文件大小超过限制 (最大{max_size // (1024 * 1024)}MB)"
+                        break
+                    sha256.update(chunk)
+                    f.write(chunk)
             
-            file_info = {
-                "filename": uploaded_file.name,
-                "file_ext": file_ext,
-                "file_size": file_size,
-                "content": uploaded_file.getvalue()
-            }
+            if not header and not file_info["error"]:
+                file_info["error"] = "文件为空"
+            if not file_info["error"] and file_info["header_info"]["type"] == "pdf":
+                # PDF 页数只在交叉引用表中，写完后、重命名之前补充校验
+                is_valid, error_msg, file_info["header_info"] = validator.validate_pdf(temp_path, file_info["header_info"])
+                file_info["error"] = error_msg
+            if file_info["error"]:
+                os.remove(temp_path)
+                return file_info
             
+            content_hash = sha256.hexdigest()
+            content_type = file_info["header_info"]["type"]
+            file_info["content_hash"] = content_hash
+            stored = self.find_stored(content_hash, content_type)
+            if stored:
+                os.remove(temp_path)
+                file_info.update(stored)
+            else:
+                file_path = self.content_path(content_hash, content_type)
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                os.replace(temp_path, file_path)
+                file_info["file_path"] = file_path
+                file_info["file_type"] = TYPE_EXTENSIONS[content_type][1:]
+                file_info["stored_size"] = file_info["file_size"]
             return file_info
         except Exception as e:
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
             st.error(f"读取文件失败: {str(e)}")
             return None
     
-    def validate_file(self, file_info: dict) -> tuple[bool, str]:
-        allowed_extensions = [".pdf", ".jpg", ".jpeg", ".png", ".bmp"]
-        max_size = 10 * 1024 * 1024
-        
-        if file_info["file_ext"] not in allowed_extensions:
-            return False, f"不支持的文件类型: {file_info['file_ext']}"
+    def find_stored(self, content_hash: str, content_type: str) -> Optional[dict]:
+        """
+        查找已保存的同一内容：先按记录中的 content_hash（文件可能已被重新压缩，路径和格式都变了），
+        再按内容寻址路径（已写入但尚未登记）；找到的文件会被认领，避免被清理任务删除
+        :param content_type: 文件头识别出的内容类型（pdf、jpeg、png、bmp）
+        :return: 含 file_path、file_type、stored_size 的字典，没有时返回None
+        """
+        candidates = []
+        row = db.get_stored_file(content_hash)
+        if row:
+            candidates.append((row["file_path"], row["file_type"]))
+        candidates.append((self.content_path(content_hash, content_type), TYPE_EXTENSIONS[content_type][1:]))
         
-        if file_info["file_size"] > max_size:
-            return False, f"文件大小超过限制 (最大10MB)"
-        
-        return True, ""
+        for file_path, file_type in candidates:
+            if self.claim(file_path):
+                return {"file_path": file_path, "file_type": file_type, "stored_size": os.path.getsize(file_path)}
+        return None
     
-    def save_to_disk(self, file_info: dict) -> str:
-        unique_name = str(uuid.uuid4()) + file_info["file_ext"]
-        file_path = os.path.join(self.upload_dir, unique_name)
-        
-        with open(file_path, "wb") as f:
-            f.write(file_info["content"])
-        
-        return file_path
+    @staticmethod
+    def claim(file_path: str) -> bool:
+        """
+        认领已保存的文件：更新修改时间，清理任务只删除超过宽限期未被认领、且没有记录引用的文件
+        :return: 文件存在时返回True（已被删除时返回False，调用方应重新写入）
+        """
+        try:
+            os.utime(file_path)
+            return True
+        except FileNotFoundError:
+            return False
+    
+    def content_path(self, content_hash: str, content_type: str) -> str:
+        """
+        按内容寻址的存储路径：uploads/ab/cd/<sha256><ext>，两级目录分片避免单目录文件过多
+        扩展名由内容类型决定，与上传时的文件名无关
+        """
+        return os.path.join(self.upload_dir, content_hash[:2], content_hash[2:4],
+                            content_hash + TYPE_EXTENSIONS[content_type])
+
+
+class UploadSession:
+    """
+    一次上传在 Streamlit 多次重新运行之间的处理状态，保存在 st.session_state 中
+    状态只前进不后退：received -> stored -> registered，校验失败为 rejected；
+    每个阶段的结果（文件路径、文件ID、渲染图）记录下来，之后的重新运行直接复用
+    """
+    RECEIVED = "received"
+    REJECTED = "rejected"
+    STORED = "stored"
+    REGISTERED = "registered"
+    
+    def __init__(self, identity: str, file_info: dict):
+        """
+        :param identity: 上传控件中文件的标识（file_id，没有时为文件名）
+        :param file_info: FileUploader.ingest 返回的文件信息
+        """
+        self.identity = identity
+        self.file_info = file_info
+        self.state = self.RECEIVED
+        self.error = ""
+        self.file_path = None
+        self.file_id = None
+        # 近似重复检测结果，登记前查询一次
+        self.duplicate = None
+        # 最近一次渲染/解码的结果：(渲染参数, 图片, 解码统计)
+        self.render = None
+        # 最近一次按内容区域重新渲染/解码的结果：(渲染参数, 图片, 裁剪统计)
+        self.crop = None
+    
+    @property
+    def content_hash(self) -> str:
+        return self.file_info.get("content_hash")
+    
+    def reject(self, error: str):
+        """校验失败"""
+        self.state = self.REJECTED
+        self.error = error
+    
+    def stored(self, file_path: str):
+        """已写入磁盘"""
+        self.state = self.STORED
+        self.file_path = file_path
+    
+    def registered(self, file_id: int):
+        """已登记到 files_uploads"""
+        self.state = self.REGISTERED
+        self.file_id = file_id
+    
+    def cached_render(self, render_key: tuple):
+        """与 render_key 一致时返回上次的 (图片, 解码统计)，否则返回None"""
+        if self.render is not None and self.render[0] == render_key:
+            return self.render[1], self.render[2]
+        return None
+    
+    def cache_render(self, render_key: tuple, img, stats: dict):
+        """只保留最近一次渲染结果，会话内存占用不随调整次数增长"""
+        self.render = (render_key, img, stats)
+    
+    def cached_crop(self, render_key: tuple):
+        """与 render_key 一致时返回上次裁剪的 (图片, 裁剪统计)，否则返回None"""
+        if self.crop is not None and self.crop[0] == render_key:
+            return self.crop[1], self.crop[2]
+        return None
+    
+    def cache_crop(self, render_key: tuple, img, stats: dict):
+        """只保留最近一次裁剪结果"""
+        self.crop = (render_key, img, stats)
+    
+    def release_renders(self):
+        """释放渲染结果（切换到其他上传文件时调用）"""
+        self.render = None
+        self.crop = None
@@ -1,17 +1,151 @@
 import os
+import re
+import struct
+import fitz  # PyMuPDF
+from modules.pdf_converter import fitz_lock
+
+# 按扩展名期望的文件内容类型
+EXTENSION_TYPES = {".pdf": "pdf", ".jpg": "jpeg", ".jpeg": "jpeg", ".png": "png", ".bmp": "bmp"}
+# 按内容类型保存文件时使用的扩展名（同一内容不论上传时是 .jpg 还是 .jpeg 都只保存一份）
+TYPE_EXTENSIONS = {"pdf": ".pdf", "jpeg": ".jpg", "png": ".png", "bmp": ".bmp"}
+# 图片像素数上限：超过时解码占用的内存不可控（解压炸弹），直接拒绝
+MAX_IMAGE_PIXELS = 100_000_000
+# 单边长度上限
+MAX_IMAGE_SIDE = 30_000
+# PDF 页数上限
+MAX_PDF_PAGES = 200
+# JPEG 中携带尺寸信息的帧起始标记（SOF0~SOF15，除去 DHT/JPG/DAC）
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# 线性化 PDF 的参数字典位于文件开头，其中 /N 为页数
+LINEARIZED_PAGES = re.compile(rb"/Linearized\b[^>]*?/N\s+(\d+)")
+
+
+def sniff_type(header: bytes) -> str:
+    """根据文件头的魔数判断内容类型，无法识别时返回空字符串"""
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if header.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if header.startswith(b"BM"):
+        return "bmp"
+    # PDF 规范允许文件头出现在前 1024 字节内
+    if b"%PDF-" in header[:1024]:
+        return "pdf"
+    return ""
+
+
+def _jpeg_size(header: bytes):
+    """按段长度跳过各段，读取第一个 SOF 段中的尺寸"""
+    i = 2
+    while i + 4 <= len(header):
+        if header[i] != 0xFF:
+            return None
+        marker = header[i + 1]
+        # 填充字节和无长度的标记
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            i += 2
+            continue
+        if marker in JPEG_SOF_MARKERS:
+            if i + 9 > len(header):
+                return None
+            height, width = struct.unpack(">HH", header[i + 5:i + 9])
+            return width, height
+        i += 2 + struct.unpack(">H", header[i + 2:i + 4])[0]
+    return None
+
+
+def read_image_size(header: bytes, image_type: str):
+    """
+    只读文件头获取图片尺寸，不解码像素
+    :param header: 文件开头的字节（JPEG 需包含 SOF 段，通常在前几十KB内）
+    :param image_type: sniff_type 识别的类型
+    :return: (宽, 高)，无法读取时返回None
+    """
+    if image_type == "png" and len(header) >= 24 and header[12:16] == b"IHDR":
+        return struct.unpack(">II", header[16:24])
+    if image_type == "bmp" and len(header) >= 26:
+        # BITMAPINFOHEADER 中高度为负数表示自上而下存储
+        width, height = struct.unpack("<ii", header[18:26])
+        return abs(width), abs(height)
+    if image_type == "jpeg":
+        return _jpeg_size(header)
+    return None
+
 
 class FileValidator:
     def __init__(self):
         self.allowed_extensions = {".pdf", ".jpg", ".jpeg", ".png", ".bmp"}
         self.max_file_size = 10 * 1024 * 1024
-    
+        self.max_image_pixels = MAX_IMAGE_PIXELS
+        self.max_pdf_pages = MAX_PDF_PAGES
+
     def validate_file(self, file_name: str, file_size: int) -> tuple[bool, str]:
         file_ext = os.path.splitext(file_name)[1].lower()
-        
+
         if file_ext not in self.allowed_extensions:
             return False, f"不支持的文件类型: {file_ext}"
-        
+
         if file_size > self.max_file_size:
             return False, f"文件大小超过限制 (最大10MB)"
-        
+
         return True, ""
+
+    def validate_header(self, header: bytes, file_ext: str) -> tuple[bool, str, dict]:
+        """
+        只根据文件开头的字节校验内容：魔数与扩展名一致，图片尺寸可读且不超过上限
+        :param header: 文件开头的字节
+        :param file_ext: 文件扩展名
+        :return: (是否通过, 错误信息, 头部信息)；头部信息含 type，图片含 width/height，
+                 线性化 PDF 含 num_pages（只是文件自己声明的页数，仍需 validate_pdf 校验）
+        """
+        detected_type = sniff_type(header)
+        if not detected_type:
+            return False, "无法识别的文件内容，文件可能已损坏", {}
+        if detected_type != EXTENSION_TYPES.get(file_ext):
+            return False, f"文件内容与扩展名不符: {file_ext}", {}
+
+        info = {"type": detected_type}
+        if detected_type == "pdf":
+            match = LINEARIZED_PAGES.search(header[:4096])
+            if match:
+                # 声明的页数已超限时不必接收完整个文件
+                info["num_pages"] = int(match.group(1))
+                return self._check_pages(info)
+            return True, "", info
+
+        size = read_image_size(header, detected_type)
+        if not size or not all(size):
+            return False, "无法读取图片尺寸，文件可能已损坏", info
+        info["width"], info["height"] = size
+
+        if max(size) > MAX_IMAGE_SIDE or size[0] * size[1] > self.max_image_pixels:
+            return False, f"图片尺寸过大 ({size[0]}×{size[1]})", info
+        return True, "", info
+
+    def validate_pdf(self, file_path: str, info: dict) -> tuple[bool, str, dict]:
+        """
+        补充校验 PDF：读取交叉引用表，检查是否加密并获取实际页数，不渲染任何页面
+        线性化字典中的页数只是文件头中的声明，可能与实际不符（损坏或伪造），一律以交叉引用表为准
+        :param file_path: PDF 文件路径
+        :param info: validate_header 返回的头部信息
+        :return: (是否通过, 错误信息, 头部信息)
+        """
+        try:
+            # 临时文件没有 .pdf 扩展名，需指定类型
+            with fitz_lock, fitz.open(file_path, filetype="pdf") as doc:
+                if doc.needs_pass:
+                    return False, "不支持加密的PDF文件", info
+                info["num_pages"] = doc.page_count
+        except Exception:
+            return False, "PDF文件已损坏，无法读取页数", info
+        return self._check_pages(info)
+
+    def _check_pages(self, info: dict) -> tuple[bool, str, dict]:
+        if info["num_pages"] < 1:
+            return False, "PDF文件没有页面", info
+        if info["num_pages"] > self.max_pdf_pages:
+            return False, f"PDF页数过多 ({info['num_pages']}页，最多{self.max_pdf_pages}页)", info
+        return True, "", info
@@ -1,23 +1,263 @@
+import math
+import time
 import base64
-from PIL import Image, ImageOps
+from PIL import Image
 from io import BytesIO
+from typing import Optional
 import numpy as np
+from modules.memory_budget import MAX_DECODE_BYTES, budget_scale, decode_budget, estimate_image_bytes
+
+# 直角旋转（逆时针角度）对应的无损转置操作
+RIGHT_ANGLE_TRANSPOSE = {
+    90: Image.ROTATE_90,
+    180: Image.ROTATE_180,
+    270: Image.ROTATE_270
+}
+
+# EXIF 方向标记对应的转置操作（与 ImageOps.exif_transpose 一致）
+EXIF_ORIENTATION_TRANSPOSE = {
+    2: Image.FLIP_LEFT_RIGHT,
+    3: Image.ROTATE_180,
+    4: Image.FLIP_TOP_BOTTOM,
+    5: Image.TRANSPOSE,
+    6: Image.ROTATE_270,
+    7: Image.TRANSVERSE,
+    8: Image.ROTATE_90
+}
+
+# 自动校正、裁剪：检测用缩略图的最长边（按整数倍缩小，实际在此值到两倍之间）
+ORIENTATION_SAMPLE_SIZE = 600
+# 检测时忽略的四周边距比例（证书常有装饰边框）
+ORIENTATION_MARGIN = 0.1
+# 倾斜检测范围和步长（度）
+DESKEW_MAX_ANGLE = 10.0
+DESKEW_STEP = 0.25
+# 列投影起伏超过行投影的倍数时，认为文字是竖排的（需要旋转90°）
+QUARTER_TURN_MIN_RATIO = 1.5
+# 文字页面中空白行（行间距）所占比例的下限，只在前景外接范围内统计（页面白边不算行间距）
+TEXT_GAP_MIN_FRACTION = 0.2
+# 文字页面至少的文字行数
+TEXT_MIN_LINES = 3
+# 下部最长笔画至少是上部的倍数时，才认为倒置（标题字号大，通常在上方）
+TITLE_STROKE_MIN_RATIO = 1.25
+# 判断倒置时上下两部分各自至少的竖向笔画数，笔画太少时不翻转
+TITLE_STROKE_MIN_COUNT = 20
+# 自动裁剪：背景色取自四周宽度为此比例的边缘
+CROP_BORDER_FRACTION = 0.02
+# 与背景色的差异超过此值的像素视为内容
+CROP_BACKGROUND_THRESHOLD = 40
+# 内容像素占比超过此值的行/列才计入内容范围（忽略噪点、扫描灰尘）
+CROP_MIN_LINE_FRACTION = 0.005
+# 裁剪框四周保留的边距比例
+CROP_PADDING = 0.02
+# 裁剪后面积不小于原图的此比例时不裁剪
+CROP_MIN_SAVING = 0.05
+# 提取接口图片载荷上限（Base64 编码后的字节数，约为 JPEG 字节数的 4/3）
+PAYLOAD_MAX_BYTES = 512 * 1024
+# 控制载荷时的 JPEG 质量范围，低于下限时改为缩小尺寸，保证文字笔画清晰
+PAYLOAD_MIN_QUALITY = 60
+PAYLOAD_MAX_QUALITY = 92
+# 控制载荷时缩小尺寸的下限（最长边像素）
+PAYLOAD_MIN_SIDE = 600
+# 彩色像素（通道差超过40）占比低于此值时按灰度编码
+GRAYSCALE_MAX_COLOR_FRACTION = 0.01
+# 交互编辑代理图的最长边
+PROXY_MAX_SIDE = 800
+# 倾斜检测的置信度下限（最佳角度投影能量 / 0°投影能量 - 1）
+DESKEW_MIN_CONFIDENCE = 0.05
+
+
+def otsu_threshold(histogram) -> int:
+    """
+    大津法阈值：使前景、背景两类灰度方差最大
+    :param histogram: 256级灰度直方图
+    :return: 阈值（灰度小于等于阈值为前景）
+    """
+    hist = np.asarray(histogram[:256], dtype=np.float64)
+    total = hist.sum()
+    if total == 0:
+        return 127
+    levels = np.arange(256)
+    weight_bg = np.cumsum(hist)
+    weight_fg = total - weight_bg
+    cumulative_mean = np.cumsum(hist * levels)
+    mean_bg = cumulative_mean / np.maximum(weight_bg, 1)
+    mean_fg = (cumulative_mean[-1] - cumulative_mean) / np.maximum(weight_fg, 1)
+    between = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+    return int(np.argmax(between))
+
+
+def autocontrast_lut(histogram: np.ndarray, cutoff: float = 1) -> np.ndarray:
+    """
+    自动对比度查找表（与 ImageOps.autocontrast 规则一致）：去掉两端 cutoff% 的像素后线性拉伸到 0-255
+    :param histogram: 单通道256级直方图
+    :param cutoff: 两端各去掉的像素百分比
+    :return: 256项查找表
+    """
+    levels = np.arange(256)
+    total = histogram.sum()
+    cumulative = np.cumsum(histogram)
+    cut = total * cutoff / 100
+    # 去掉暗端、亮端各 cut 个像素后剩余的最小、最大灰度
+    low = int(np.searchsorted(cumulative, cut, side="right"))
+    high = int(np.searchsorted(cumulative, total - cut, side="left"))
+    if high <= low:
+        return levels
+    scale = 255.0 / (high - low)
+    return np.clip((levels - low) * scale, 0, 255).astype(np.int64)
+
+
+def equalize_lut(histogram: np.ndarray) -> np.ndarray:
+    """
+    直方图均衡化查找表（与 ImageOps.equalize 规则一致）
+    :param histogram: 单通道256级直方图
+    :return: 256项查找表
+    """
+    levels = np.arange(256)
+    used = histogram[histogram > 0]
+    if len(used) <= 1:
+        return levels
+    step = int(used.sum() - used[-1]) // 255
+    if not step:
+        return levels
+    cumulative = np.concatenate(([0], np.cumsum(histogram)[:-1]))
+    return np.minimum((cumulative + step // 2) // step, 255).astype(np.int64)
+
+
+def remap_histogram(histogram: np.ndarray, lut: np.ndarray) -> np.ndarray:
+    """经过查找表映射后的直方图（无需再扫描一遍像素）"""
+    return np.bincount(lut, weights=histogram, minlength=256)
+
+
+def region_box(size: tuple, region: tuple) -> tuple:
+    """比例坐标 (left, top, right, bottom) 换算为 size 大小图片上的像素矩形"""
+    width, height = size
+    left, top, right, bottom = region
+    return (int(left * width), int(top * height),
+            max(int(left * width) + 1, round(right * width)), max(int(top * height) + 1, round(bottom * height)))
+
+
+class EncodedImage:
+    """编码后的图片：保存原始字节，Base64 data URI 在首次使用时生成"""
+    
+    def __init__(self, data: bytes, size: tuple, quality: int, grayscale: bool, progressive: bool,
+                 image_format: str = "JPEG"):
+        self.data = data
+        self.size = size
+        self.quality = quality
+        self.grayscale = grayscale
+        self.progressive = progressive
+        self.mime_type = f"image/{image_format.lower()}"
+        self._data_uri = None
+    
+    def __len__(self) -> int:
+        return len(self.data)
+    
+    @property
+    def data_uri(self) -> str:
+        """data:image/jpeg;base64,... 形式的字符串"""
+        if self._data_uri is None:
+            self._data_uri = f"data:{self.mime_type};base64,{base64.b64encode(self.data).decode('utf-8')}"
+        return self._data_uri
+
 
 class ImageProcessor:
     def __init__(self):
-        pass
+        # 最近一次 load_image 的解码统计
+        self.last_load_stats = {}
+        # 最近一次 auto_crop 的裁剪统计
+        self.last_crop_stats = {}
+    
+    def load_image(self, source, max_width: Optional[int] = None, max_height: Optional[int] = None,
+                   max_bytes: int = MAX_DECODE_BYTES, region: Optional[tuple] = None) -> Image.Image:
+        """
+        读取图片；JPEG 利用 DCT 缩放（draft）直接按接近目标尺寸的 1/2、1/4、1/8 比例解码，
+        不必先完整解码再缩小；其他格式解码后立即按整数倍缩小。解码结果不小于目标尺寸，
+        最终缩放仍由 resize_image 完成
+        解码前根据文件头估算内存：结果不超过 max_bytes，并在进程共享的解码预算内排队，
+        多个会话同时上传大图时内存占用有上限
+        :param source: 文件路径或文件对象
+        :param max_width: 目标最大宽度，为空时完整解码
+        :param max_height: 目标最大高度，为空时完整解码
+        :param max_bytes: 解码结果的内存上限（字节）
+        :param region: 只保留图片上的这一区域（摆正后相对整图的比例坐标 (left, top, right, bottom)），
+                       解码比例按区域而不是整图满足目标尺寸，裁剪后的证书内容获得全部像素
+        :return: 已解码的Image对象
+        """
+        try:
+            start = time.perf_counter()
+            img = Image.open(source)
+            image_format = img.format
+            original_size = img.size
+            original_bytes = estimate_image_bytes(original_size, img.mode)
+            # 缩小后的图片不带 EXIF，先记下方向
+            orientation = img.getexif().get(0x0112, 1)
+            
+            # 区域在原始像素方向上占整图的比例（EXIF 方向为转置类时宽高互换）
+            region_x = region_y = 1.0
+            if region:
+                region_x, region_y = region[2] - region[0], region[3] - region[1]
+                if orientation in (5, 6, 7, 8):
+                    region_x, region_y = region_y, region_x
+            
+            # 目标尺寸和内存上限中较小的缩放比例
+            scale = budget_scale(original_bytes, max_bytes)
+            if max_width or max_height:
+                scale = min(scale, (max_width or img.width * region_x) / (img.width * region_x),
+                            (max_height or img.height * region_y) / (img.height * region_y))
+            
+            if img.format == "JPEG" and scale < 1:
+                img.draft(None, (max(1, int(img.width * scale)), max(1, int(img.height * scale))))
+            
+            # draft 之后 img.size 即为实际解码尺寸；非 JPEG 只能完整解码，按完整尺寸预留
+            with decode_budget.reserve(estimate_image_bytes(img.size, img.mode)):
+                img.load()
+                
+                # 不支持按比例解码的格式：立即按整数倍缩小（不小于目标尺寸，且满足内存上限）
+                factor = math.ceil(1 / budget_scale(estimate_image_bytes(img.size, img.mode), max_bytes))
+                if max_width or max_height:
+                    factor = max(factor, int(min(img.width * region_x / (max_width or img.width * region_x),
+                                                 img.height * region_y / (max_height or img.height * region_y))))
+                if factor > 1:
+                    img = img.reduce(factor)
+            decode_ms = (time.perf_counter() - start) * 1000
+            
+            # 按 EXIF 方向信息摆正手机拍摄的照片（无方向信息时不复制图片）
+            if orientation in EXIF_ORIENTATION_TRANSPOSE:
+                img = img.transpose(EXIF_ORIENTATION_TRANSPOSE[orientation])
+            
+            reduction = (original_size[0] * original_size[1]) / (img.width * img.height)
+            decoded_size = img.size
+            if region:
+                img = img.crop(region_box(img.size, region))
+            self.last_load_stats = {
+                "format": image_format,
+                "original_size": original_size,
+                "decoded_size": decoded_size,
+                # 解码像素数缩减倍数，1 表示完整解码
+                "reduction": reduction,
+                "decode_ms": decode_ms
+            }
+            return img
+        except Exception as e:
+            raise Exception(f"读取图片失败: {str(e)}")
     
     def resize_image(self, img: Image.Image, max_width: int = 800, max_height: int = 1200) -> Image.Image:
         """
-        调整图片尺寸，保持原始比例
+        调整图片尺寸，保持原始比例（只缩小不放大，不修改传入的图片）
         :param img: PIL Image对象
         :param max_width: 最大宽度
         :param max_height: 最大高度
         :return: 调整后的Image对象
         """
         try:
-            img.thumbnail((max_width, max_height), Image.LANCZOS)
-            return img
+            # 与 thumbnail 相同的缩放规则，但返回新图片，传入的图片可能来自渲染缓存
+            scale = min(max_width / img.width, max_height / img.height)
+            if scale >= 1:
+                return img
+            
+            size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+            return img.resize(size, Image.LANCZOS, reducing_gap=2.0)
         except Exception as e:
             raise Exception(f"调整图片尺寸失败: {str(e)}")
     
@@ -29,11 +269,238 @@ class ImageProcessor:
         :return: 旋转后的Image对象
         """
         try:
-            rotated_img = img.rotate(angle, expand=True, fillcolor="white")
+            angle = angle % 360
+            right_angle = round(angle / 90) * 90
+            if abs(angle - right_angle) < 1e-6:
+                # 直角旋转使用转置：无损，且只是像素搬移，不需要插值
+                right_angle %= 360
+                if right_angle == 0:
+                    return img
+                return img.transpose(RIGHT_ANGLE_TRANSPOSE[right_angle])
+            
+            rotated_img = img.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor="white")
             return rotated_img
         except Exception as e:
             raise Exception(f"旋转图片失败: {str(e)}")
     
+    @staticmethod
+    def _detection_sample(img: Image.Image) -> Image.Image:
+        """检测用的缩略图：按整数倍块平均缩小（reduce），比 LANCZOS 重采样快得多，检测不需要高质量插值"""
+        factor = max(1, max(img.width, img.height) // ORIENTATION_SAMPLE_SIZE)
+        return img.reduce(factor) if factor > 1 else img
+    
+    def _ink_mask(self, img: Image.Image) -> np.ndarray:
+        """
+        检测用的前景（黑色文字）掩码：缩略图去掉边框后，取各通道最大值按大津法二值化
+        用通道最大值而不是灰度，红色印章、彩色边框和浅色水印不会被当作文字
+        """
+        small = self._detection_sample(img).convert("RGB")
+        margin_x = int(small.width * ORIENTATION_MARGIN)
+        margin_y = int(small.height * ORIENTATION_MARGIN)
+        small = small.crop((margin_x, margin_y, small.width - margin_x, small.height - margin_y))
+        value = np.asarray(small).max(axis=2)
+        return value <= otsu_threshold(np.bincount(value.ravel(), minlength=256))
+    
+    @staticmethod
+    def _profile_variation(profile: np.ndarray) -> float:
+        """投影曲线的起伏程度（变异系数），文字行与行间空白交替时数值大"""
+        mean = profile.mean()
+        return float(profile.std() / mean) if mean > 0 else 0.0
+    
+    @staticmethod
+    def _vertical_runs(mask: np.ndarray) -> tuple:
+        """每一列中连续前景像素段的长度及其中心行号（近似文字竖向笔画的长度和位置）"""
+        padded = np.zeros((mask.shape[0] + 2, mask.shape[1]), dtype=np.int8)
+        padded[1:-1] = mask
+        edges = np.diff(padded, axis=0)
+        # 转置后按列、列内按行的顺序取起止点，保证起点和终点一一对应
+        start_x, start_y = np.nonzero(edges.T == 1)
+        _, end_y = np.nonzero(edges.T == -1)
+        return end_y - start_y, (start_y + end_y) / 2
+    
+    @staticmethod
+    def _looks_like_text(profile: np.ndarray) -> bool:
+        """
+        投影是否像横排文字：在前景的外接范围内（不含页面白边）有足够的空白行，且分成多行
+        插图、照片在外接范围内几乎没有空白行
+        """
+        inked_rows = np.nonzero(profile)[0]
+        if len(inked_rows) == 0:
+            return False
+        inked = profile[inked_rows[0]:inked_rows[-1] + 1] > 0
+        lines = np.count_nonzero(np.diff(inked.astype(np.int8)) == 1) + 1
+        return (~inked).mean() >= TEXT_GAP_MIN_FRACTION and lines >= TEXT_MIN_LINES
+    
+    def _is_upside_down(self, mask: np.ndarray) -> bool:
+        """
+        证书标题通常字号最大且位于上方：比较上下两部分最长的竖向笔画，
+        下部明显更长（超过 TITLE_STROKE_MIN_RATIO 倍）且两部分都有足够笔画时才认为倒置，
+        差异不明显时保持原方向（按行统计文字带会把落款处左右错开的多行合并，不可靠）
+        """
+        lengths, centers = self._vertical_runs(mask)
+        height = mask.shape[0]
+        top = lengths[centers < height * 0.4]
+        bottom = lengths[centers > height * 0.6]
+        if len(top) < TITLE_STROKE_MIN_COUNT or len(bottom) < TITLE_STROKE_MIN_COUNT:
+            return False
+        return np.percentile(bottom, 95) >= TITLE_STROKE_MIN_RATIO * np.percentile(top, 95)
+    
+    def detect_orientation(self, img: Image.Image) -> int:
+        """
+        检测证书需要旋转的直角角度
+        :param img: PIL Image对象
+        :return: 0/90/180/270（逆时针，与 rotate_image 一致）
+        """
+        mask = self._ink_mask(img)
+        if mask.mean() < 0.001:
+            return 0
+        
+        angle = 0
+        row_profile, column_profile = mask.sum(axis=1), mask.sum(axis=0)
+        rows_text, columns_text = self._looks_like_text(row_profile), self._looks_like_text(column_profile)
+        # 两个方向都不像文字行（如插图、照片），不做调整
+        if not rows_text and not columns_text:
+            return 0
+        
+        if columns_text and (not rows_text or self._profile_variation(column_profile) >
+                             QUARTER_TURN_MIN_RATIO * self._profile_variation(row_profile)):
+            # 文字竖排：先转成横排再判断是否倒置
+            angle = 90
+            mask = np.rot90(mask)
+        
+        if self._is_upside_down(mask):
+            angle += 180
+        return angle % 360
+    
+    def estimate_skew(self, img: Image.Image, max_angle: float = DESKEW_MAX_ANGLE,
+                      step: float = DESKEW_STEP) -> tuple:
+        """
+        投影法估计小角度倾斜：在候选角度上错切前景像素，文字行对齐时行投影最集中（平方和最大）
+        :param img: PIL Image对象（已摆正方向）
+        :param max_angle: 检测范围（度）
+        :param step: 角度步长（度）
+        :return: (校正角度（逆时针，度）, 置信度)
+        """
+        mask = self._ink_mask(img)
+        ys, xs = np.nonzero(mask)
+        if len(ys) < 100:
+            return 0.0, 0.0
+        
+        angles = np.arange(-max_angle, max_angle + step / 2, step)
+        scores = []
+        for angle in angles:
+            shifted = ys + xs * math.tan(math.radians(angle))
+            profile = np.bincount(np.round(shifted - shifted.min()).astype(np.int64))
+            scores.append(float(np.dot(profile, profile)))
+        scores = np.asarray(scores)
+        
+        best = int(np.argmax(scores))
+        baseline = scores[len(angles) // 2]
+        confidence = scores[best] / baseline - 1 if baseline > 0 else 0.0
+        # 错切角度与图片的倾斜方向相同，校正时反向旋转
+        return float(-angles[best]), float(confidence)
+    
+    def detect_rotation(self, img: Image.Image) -> dict:
+        """
+        自动检测需要的旋转角度：先判断直角方向，再在摆正后的缩略图上估计倾斜
+        :param img: PIL Image对象
+        :return: {'orientation': 直角方向, 'skew': 倾斜角度, 'confidence': 倾斜置信度, 'angle': 合计校正角度}
+        """
+        try:
+            small = self._detection_sample(img)
+            orientation = self.detect_orientation(small)
+            skew, confidence = self.estimate_skew(self.rotate_image(small, orientation))
+            if confidence < DESKEW_MIN_CONFIDENCE:
+                skew = 0.0
+            return {
+                'orientation': orientation,
+                'skew': skew,
+                'confidence': confidence,
+                'angle': orientation + skew
+            }
+        except Exception as e:
+            raise Exception(f"检测图片方向失败: {str(e)}")
+    
+    def detect_content_bbox(self, img: Image.Image) -> Optional[tuple]:
+        """
+        检测证书内容所在的矩形：以四周边缘的中位颜色为背景（扫描件的白边、照片中的桌面），
+        在缩略图上找出与背景差异明显的行和列
+        :param img: PIL Image对象
+        :return: 原图坐标下的 (left, top, right, bottom)，未检测到内容时返回 None
+        """
+        small = self._detection_sample(img).convert("RGB")
+        pixels = np.asarray(small).astype(np.int16)
+        height, width = pixels.shape[:2]
+        
+        border = max(1, int(min(width, height) * CROP_BORDER_FRACTION))
+        edges = np.concatenate([
+            pixels[:border].reshape(-1, 3), pixels[-border:].reshape(-1, 3),
+            pixels[:, :border].reshape(-1, 3), pixels[:, -border:].reshape(-1, 3)
+        ])
+        background = np.median(edges, axis=0)
+        content = np.abs(pixels - background).max(axis=2) > CROP_BACKGROUND_THRESHOLD
+        
+        rows = np.nonzero(content.mean(axis=1) > CROP_MIN_LINE_FRACTION)[0]
+        columns = np.nonzero(content.mean(axis=0) > CROP_MIN_LINE_FRACTION)[0]
+        if len(rows) == 0 or len(columns) == 0:
+            return None
+        
+        # 缩略图坐标换算回原图，并留出少量边距
+        scale_x, scale_y = img.width / width, img.height / height
+        pad_x, pad_y = img.width * CROP_PADDING, img.height * CROP_PADDING
+        return (
+            max(0, int(columns[0] * scale_x - pad_x)),
+            max(0, int(rows[0] * scale_y - pad_y)),
+            min(img.width, int((columns[-1] + 1) * scale_x + pad_x)),
+            min(img.height, int((rows[-1] + 1) * scale_y + pad_y))
+        )
+    
+    def content_region(self, img: Image.Image) -> Optional[tuple]:
+        """
+        检测需要保留的证书内容区域，结果记录在 last_crop_stats
+        只需在较小的渲染/解码结果上检测，再按区域重新渲染（PDF）或解码（图片）到目标尺寸
+        :param img: PIL Image对象
+        :return: 相对整图的比例坐标 (left, top, right, bottom)，裁掉的面积不足 CROP_MIN_SAVING 时返回 None
+        """
+        try:
+            bbox = self.detect_content_bbox(img)
+            original_area = img.width * img.height
+            cropped_area = original_area
+            if bbox is not None:
+                cropped_area = (bbox[2] - bbox[0]) * (bbox[3] - bbox[1])
+            
+            area_saved = 1 - cropped_area / original_area
+            region = None
+            if bbox is None or area_saved < CROP_MIN_SAVING:
+                bbox, area_saved = None, 0.0
+            else:
+                region = (bbox[0] / img.width, bbox[1] / img.height, bbox[2] / img.width, bbox[3] / img.height)
+            
+            self.last_crop_stats = {
+                "bbox": bbox,
+                "region": region,
+                "cropped_size": (bbox[2] - bbox[0], bbox[3] - bbox[1]) if bbox else img.size,
+                # 裁掉的面积比例
+                "area_saved": area_saved
+            }
+            return region
+        except Exception as e:
+            raise Exception(f"检测内容区域失败: {str(e)}")
+    
+    def auto_crop(self, img: Image.Image) -> Image.Image:
+        """
+        裁掉证书四周的空白边距或背景，结果记录在 last_crop_stats
+        在已缩小的图片上裁剪会损失分辨率，上传页改用 content_region 按区域重新渲染/解码
+        :param img: PIL Image对象
+        :return: 裁剪后的Image对象（无需裁剪时返回原图）
+        """
+        try:
+            self.content_region(img)
+            bbox = self.last_crop_stats["bbox"]
+            return img.crop(bbox) if bbox else img
+        except Exception as e:
+            raise Exception(f"自动裁剪失败: {str(e)}")
+    
     def image_to_base64(self, img: Image.Image, image_format: str = "JPEG") -> str:
         """
         将图片转换为Base64编码
@@ -55,6 +522,79 @@ class ImageProcessor:
         except Exception as e:
             raise Exception(f"图片转Base64失败: {str(e)}")
     
+    def _is_grayscale_content(self, img: Image.Image) -> bool:
+        """彩色像素极少（黑白扫描件、复印件）时按灰度编码，省去色度数据"""
+        if img.mode in ("L", "1"):
+            return True
+        pixels = np.asarray(self._detection_sample(img).convert("RGB")).astype(np.int16)
+        chroma = pixels.max(axis=2) - pixels.min(axis=2)
+        return (chroma > 40).mean() < GRAYSCALE_MAX_COLOR_FRACTION
+    
+    @staticmethod
+    def _encode_jpeg(img: Image.Image, quality: int, progressive: bool = False, optimize: bool = False) -> bytes:
+        buffer = BytesIO()
+        img.save(buffer, format="JPEG", quality=quality, progressive=progressive, optimize=optimize)
+        return buffer.getvalue()
+    
+    def _search_quality(self, img: Image.Image, max_bytes: int) -> tuple:
+        """
+        二分查找不超过 max_bytes 的最高质量
+        查找时用不做哈夫曼优化的基线编码（最快，且结果偏大），最终优化编码只会更小
+        :return: (质量, 该质量下的字节数)，最低质量仍超出时返回最低质量
+        """
+        size = len(self._encode_jpeg(img, PAYLOAD_MAX_QUALITY))
+        if size <= max_bytes:
+            return PAYLOAD_MAX_QUALITY, size
+        
+        low, high = PAYLOAD_MIN_QUALITY, PAYLOAD_MAX_QUALITY - 1
+        best = None
+        while low <= high:
+            middle = (low + high) // 2
+            size = len(self._encode_jpeg(img, middle))
+            if size <= max_bytes:
+                best = (middle, size)
+                low = middle + 1
+            else:
+                high = middle - 1
+        if best is None:
+            return PAYLOAD_MIN_QUALITY, len(self._encode_jpeg(img, PAYLOAD_MIN_QUALITY))
+        return best
+    
+    def encode_image(self, img: Image.Image, max_bytes: int = PAYLOAD_MAX_BYTES) -> EncodedImage:
+        """
+        按载荷上限编码 JPEG：先二分查找满足上限的最高质量，质量降到下限仍超出时再缩小尺寸；
+        彩色像素极少时按灰度编码，最终在渐进式与基线式（均做哈夫曼优化）中取较小者
+        :param img: PIL Image对象
+        :param max_bytes: 载荷上限（Base64 编码后的字节数）
+        :return: EncodedImage对象（缩小到 PAYLOAD_MIN_SIDE 仍超出上限时为能达到的最小结果）
+        """
+        try:
+            # Base64 每3字节编码为4个字符
+            max_jpeg_bytes = max_bytes * 3 // 4
+            grayscale = self._is_grayscale_content(img)
+            img = img.convert("L" if grayscale else "RGB")
+            
+            while True:
+                quality, size = self._search_quality(img, max_jpeg_bytes)
+                longest_side = max(img.width, img.height)
+                if size <= max_jpeg_bytes or longest_side <= PAYLOAD_MIN_SIDE:
+                    break
+                
+                # 最低质量仍超出上限：按字节比例估算缩小比例（字节数与面积近似成正比）
+                scale = max(math.sqrt(max_jpeg_bytes / size) * 0.95, PAYLOAD_MIN_SIDE / longest_side)
+                img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))),
+                                 Image.LANCZOS, reducing_gap=2.0)
+            
+            data = self._encode_jpeg(img, quality, progressive=True, optimize=True)
+            progressive = True
+            baseline = self._encode_jpeg(img, quality, optimize=True)
+            if len(baseline) < len(data):
+                data, progressive = baseline, False
+            
+            return EncodedImage(data, img.size, quality, grayscale, progressive)
+        except Exception as e:
+            raise Exception(f"图片编码失败: {str(e)}")
+    
     def bytes_to_base64(self, img_bytes: bytes, image_format: str = "JPEG") -> str:
         """
         将字节流转换为Base64编码
@@ -70,42 +610,160 @@ class ImageProcessor:
             raise Exception(f"字节流转Base64失败: {str(e)}")
     
     def process_image(self, img: Image.Image, max_width: int = 800, max_height: int = 1200, 
-                     rotate_angle: float = 0) -> Image.Image:
+                     rotate_angle: float = 0, normalize: bool = False, grayscale: bool = False,
+                     binarize: bool = False, crop: bool = False) -> Image.Image:
         """
-        综合处理图片（调整尺寸、旋转）
+        综合处理图片（裁剪、调整尺寸、旋转、标准化）
         :param img: PIL Image对象
         :param max_width: 最大宽度
         :param max_height: 最大高度
         :param rotate_angle: 旋转角度
+        :param normalize: 是否增强对比度（自动对比度 + 均衡化）
+        :param grayscale: 是否转为灰度
+        :param binarize: 是否二值化
+        :param crop: 是否自动裁掉空白边距或背景（在缩放前进行，同样尺寸下文字更清晰）
         :return: 处理后的Image对象
         """
         try:
-            # 旋转图片
-            if rotate_angle != 0:
+            if crop:
+                img = self.auto_crop(img)
+            
+            if rotate_angle % 360 != 0:
+                # 先缩小再旋转：按旋转后外接矩形计算缩放比例，旋转只在缩小后的图片上进行
+                radians = math.radians(rotate_angle)
+                cos, sin = abs(math.cos(radians)), abs(math.sin(radians))
+                rotated_width = img.width * cos + img.height * sin
+                rotated_height = img.width * sin + img.height * cos
+                scale = min(max_width / rotated_width, max_height / rotated_height)
+                if scale < 1:
+                    img = self.resize_image(img, round(img.width * scale), round(img.height * scale))
+                
+                # 旋转图片
                 img = self.rotate_image(img, rotate_angle)
             
-            # 调整尺寸
+            # 调整尺寸（旋转后取整误差可能超出1像素，此处保证最终尺寸不超限）
             img = self.resize_image(img, max_width, max_height)
             
+            # 标准化放在缩小之后，只处理最终尺寸的像素
+            if normalize or grayscale or binarize:
+                img = self.normalize_image(img, grayscale, binarize) if normalize or binarize else img.convert("L")
+            
             return img
         except Exception as e:
             raise Exception(f"处理图片失败: {str(e)}")
     
-    def normalize_image(self, img: Image.Image) -> Image.Image:
+    def normalize_image(self, img: Image.Image, grayscale: bool = False, binarize: bool = False,
+                        cutoff: float = 1) -> Image.Image:
         """
-        标准化图片（调整亮度、对比度）
+        标准化图片（自动对比度 + 直方图均衡化，可选灰度；二值化时以自动对比度 + 大津法阈值代替均衡化）
+        只统计一次直方图，在直方图上依次推导各步骤的查找表并合并为一张，再用 point 一次完成映射
         :param img: PIL Image对象
+        :param grayscale: 是否转为灰度
+        :param binarize: 是否二值化（大津法阈值，隐含灰度）
+        :param cutoff: 自动对比度两端去掉的像素百分比
         :return: 标准化后的Image对象
         """
         try:
-            # 转换为灰度图（如果需要）
-            if img.mode != "RGB":
-                img = img.convert("RGB")
+            target_mode = "L" if grayscale or binarize else "RGB"
+            if img.mode != target_mode:
+                img = img.convert(target_mode)
             
-            # 调整对比度和亮度
-            img = ImageOps.autocontrast(img, cutoff=1)
-            img = ImageOps.equalize(img)
+            channels = np.asarray(img.histogram(), dtype=np.float64).reshape(-1, 256)
+            luts = []
+            for histogram in channels:
+                lut = autocontrast_lut(histogram, cutoff)
+                stretched = remap_histogram(histogram, lut)
+                if binarize:
+                    # 均衡化会把大片白底拉开成多级灰度，使水印等浅色内容落到阈值以下，二值化只在拉伸后进行
+                    lut = np.where(lut > otsu_threshold(stretched), 255, 0)
+                else:
+                    lut = equalize_lut(stretched)[lut]
+                luts.append(lut)
             
-            return img
+            return img.point(np.concatenate(luts).astype(np.uint8).tolist())
         except Exception as e:
-            raise Exception(f"标准化图片失败: {str(e)}")
\ No newline at end of file
+            raise Exception(f"标准化图片失败: {str(e)}")
+
+
+class ProxyEditor:
+    """
+    交互编辑代理：滑块、尺寸等调整只作用于缩小后的代理图，编辑参数被记录下来，
+    提取或下载时才在原图上按记录的参数完整处理、编码一次
+    """
+    
+    def __init__(self, source: Image.Image, processor: Optional[ImageProcessor] = None,
+                 proxy_size: int = PROXY_MAX_SIDE):
+        """
+        :param source: 原图（可能来自渲染缓存，不会被修改）
+        :param processor: 图片处理器
+        :param proxy_size: 代理图最长边
+        """
+        self.processor = processor or ImageProcessor()
+        self.source = source
+        self.proxy_size = proxy_size
+        self.proxy = self.processor.resize_image(source, proxy_size, proxy_size)
+        # 最近一次预览相对最终结果的缩放比例（最终结果不大于代理图时为1）
+        self.preview_scale = 1.0
+        # 最近一次预览的编辑参数（process_image 的参数）
+        self.params = {}
+        
+        self._cropped_proxy = None
+        self._result = None
+        self._result_params = None
+        self._encoded = None
+        self._encoded_key = None
+    
+    def preview(self, max_width: int = 800, max_height: int = 1200, rotate_angle: float = 0,
+                normalize: bool = False, grayscale: bool = False, binarize: bool = False,
+                crop: bool = False) -> Image.Image:
+        """
+        在代理图上预览编辑效果并记录参数，参数含义同 ImageProcessor.process_image
+        尺寸上限超过代理图时按同一比例缩小，预览与最终结果的构图一致
+        :return: 预览图片（约为最终结果的 preview_scale 倍大小）
+        """
+        self.params = {
+            'max_width': max_width,
+            'max_height': max_height,
+            'rotate_angle': rotate_angle,
+            'normalize': normalize,
+            'grayscale': grayscale,
+            'binarize': binarize,
+            'crop': crop
+        }
+        self.preview_scale = min(1.0, self.proxy_size / max(max_width, max_height))
+        
+        proxy = self.proxy
+        if crop:
+            # 内容边界不随其他参数变化，代理图只裁剪一次
+            if self._cropped_proxy is None:
+                self._cropped_proxy = self.processor.auto_crop(self.proxy)
+            proxy = self._cropped_proxy
+        
+        return self.processor.process_image(
+            proxy,
+            max(1, round(max_width * self.preview_scale)),
+            max(1, round(max_height * self.preview_scale)),
+            rotate_angle, normalize, grayscale, binarize
+        )
+    
+    def render(self) -> Image.Image:
+        """按记录的参数在原图上完整处理，参数未变化时直接返回上次结果"""
+        if self._result is None or self._result_params != self.params:
+            self._result = self.processor.process_image(self.source, **self.params)
+            self._result_params = dict(self.params)
+        return self._result
+    
+    def encode(self, max_bytes: int = PAYLOAD_MAX_BYTES) -> EncodedImage:
+        """完整处理并按载荷上限编码，参数和上限未变化时直接返回上次结果"""
+        key = (tuple(sorted(self.params.items())), max_bytes)
+        if self._encoded is None or self._encoded_key != key:
+            self._encoded = self.processor.encode_image(self.render(), max_bytes)
+            self._encoded_key = key
+        return self._encoded
+    
+    def encoded(self, max_bytes: int = PAYLOAD_MAX_BYTES) -> Optional[EncodedImage]:
+        """已完成且与当前参数一致的编码结果，尚未编码或参数已变化时返回 None"""
+        if self._encoded_key == (tuple(sorted(self.params.items())), max_bytes):
+            return self._encoded
+        return None
+
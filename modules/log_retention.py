@@ -0,0 +1,175 @@
+# modules/log_retention.py
+import os
+import sys
+import gzip
+import json
+import logging
+from datetime import datetime, date
+from typing import Dict, List, Optional
+from sqlalchemy import text
+
+# 获取当前文件所在目录
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+
+# 添加父目录到Python路径
+sys.path.append(parent_dir)
+
+from modules.database import db
+
+# 设置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 默认保留最近12个月的日志，更早的分区归档后删除
+DEFAULT_RETAIN_MONTHS = 12
+# 提前创建的月度分区数量
+DEFAULT_MONTHS_AHEAD = 2
+
+
+def _add_months(day: date, months: int) -> date:
+    """返回 day 所在月份偏移 months 个月后的当月1日"""
+    month_index = day.year * 12 + (day.month - 1) + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def _partition_name(month_start: date) -> str:
+    """月度分区名，如 p202610"""
+    return f"p{month_start.year}{month_start.month:02d}"
+
+
+class LogRetentionManager:
+    """user_logs 分区维护与归档"""
+
+    def __init__(self, archive_dir: str = "archives/user_logs", table: str = "user_logs"):
+        self.archive_dir = archive_dir
+        self.table = table
+
+    def list_partitions(self) -> List[Dict]:
+        """列出日志表的分区及其上界（UNIX 时间戳，p_future 为 None）"""
+        query = """
+        SELECT PARTITION_NAME AS name, PARTITION_DESCRIPTION AS description, TABLE_ROWS AS table_rows
+        FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+        """
+        partitions = []
+        for row in db.execute_query(query, {'table': self.table}):
+            description = row['description']
+            upper_bound = None if description == 'MAXVALUE' else int(description)
+            partitions.append({
+                'name': row['name'],
+                'upper_bound': upper_bound,
+                'table_rows': row['table_rows']
+            })
+        return partitions
+
+    def ensure_partitions(self, months_ahead: int = DEFAULT_MONTHS_AHEAD, today: Optional[date] = None) -> List[str]:
+        """从 p_future 中拆分出未来几个月的分区，返回新建的分区名"""
+        if not db.backend.supports_partitioning:
+            return []
+
+        today = today or date.today()
+        existing = {p['name'] for p in self.list_partitions()}
+        created = []
+
+        for offset in range(months_ahead + 1):
+            month_start = _add_months(today, offset)
+            name = _partition_name(month_start)
+            if name in existing:
+                continue
+
+            boundary = _add_months(month_start, 1).strftime('%Y-%m-%d 00:00:00')
+            ddl = f"""
+            ALTER TABLE {self.table} REORGANIZE PARTITION p_future INTO (
+                PARTITION {name} VALUES LESS THAN (UNIX_TIMESTAMP('{boundary}')),
+                PARTITION p_future VALUES LESS THAN MAXVALUE
+            )
+            """
+            with db.engine.begin() as conn:
+                conn.execute(text(ddl))
+            created.append(name)
+            logger.info(f"已创建日志分区: {name}")
+
+        return created
+
+    def _archive_rows(self, query: str, params: Dict, archive_name: str) -> str:
+        """将查询结果导出为 gzip 压缩的 JSON Lines 文件，返回归档文件路径"""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        archive_path = os.path.join(self.archive_dir, f"{self.table}_{archive_name}.jsonl.gz")
+        temp_path = archive_path + ".tmp"
+
+        rows = 0
+        with db.engine.connect() as conn:
+            # 流式读取，避免整个分区加载到内存
+            result = conn.execution_options(stream_results=True).execute(text(query), params)
+            with gzip.open(temp_path, "wt", encoding="utf-8") as f:
+                for row in result:
+                    f.write(json.dumps(dict(row._mapping), ensure_ascii=False, default=str))
+                    f.write("\n")
+                    rows += 1
+
+        # 写完再重命名，保证归档文件要么完整要么不存在
+        os.replace(temp_path, archive_path)
+        logger.info(f"已归档日志 {archive_name}: {rows} 条 -> {archive_path}")
+        return archive_path
+
+    def archive_partition(self, name: str) -> str:
+        """将分区数据导出为归档文件"""
+        return self._archive_rows(f"SELECT * FROM {self.table} PARTITION ({name}) ORDER BY id", {}, name)
+
+    def drop_partition(self, name: str):
+        """删除分区（数据随分区一起删除）"""
+        with db.engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {self.table} DROP PARTITION {name}"))
+        logger.info(f"已删除日志分区: {name}")
+
+    def apply_retention(self, retain_months: int = DEFAULT_RETAIN_MONTHS, archive: bool = True,
+                        today: Optional[date] = None) -> List[str]:
+        """归档并删除超出保留期的分区，返回处理过的分区名"""
+        today = today or date.today()
+        cutoff_day = _add_months(today, -retain_months)
+
+        if not db.backend.supports_partitioning:
+            return self._apply_retention_by_range(cutoff_day, archive)
+
+        cutoff = datetime.combine(cutoff_day, datetime.min.time()).timestamp()
+        expired = []
+
+        for partition in self.list_partitions():
+            upper_bound = partition['upper_bound']
+            # 分区上界不晚于保留期起点，说明整个分区都已过期
+            if upper_bound is None or upper_bound > cutoff:
+                continue
+
+            if archive:
+                self.archive_partition(partition['name'])
+            self.drop_partition(partition['name'])
+            expired.append(partition['name'])
+
+        return expired
+
+    def _apply_retention_by_range(self, cutoff_day: date, archive: bool) -> List[str]:
+        """不支持分区的后端（SQLite）按时间范围归档并删除"""
+        cutoff = cutoff_day.strftime('%Y-%m-%d 00:00:00')
+        archive_name = f"before_{cutoff_day.strftime('%Y%m%d')}"
+        params = {'cutoff': cutoff}
+
+        if archive:
+            self._archive_rows(f"SELECT * FROM {self.table} WHERE created_at < :cutoff ORDER BY id", params, archive_name)
+        with db.engine.begin() as conn:
+            deleted = conn.execute(text(f"DELETE FROM {self.table} WHERE created_at < :cutoff"), params).rowcount
+        logger.info(f"已删除 {cutoff} 之前的日志: {deleted} 条")
+        return [archive_name] if deleted else []
+
+    def run(self, retain_months: int = DEFAULT_RETAIN_MONTHS, months_ahead: int = DEFAULT_MONTHS_AHEAD) -> Dict:
+        """执行一次完整的维护：创建未来分区并清理过期分区"""
+        created = self.ensure_partitions(months_ahead)
+        expired = self.apply_retention(retain_months)
+        return {'created': created, 'expired': expired}
+
+
+if __name__ == "__main__":
+    # 建议通过 cron 每月执行一次：python modules/log_retention.py
+    summary = LogRetentionManager().run()
+    logger.info(f"日志分区维护完成: {summary}")
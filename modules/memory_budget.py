@@ -0,0 +1,60 @@
+# modules/memory_budget.py
+import math
+import threading
+from contextlib import contextmanager
+
+# 单张解码/渲染结果的像素内存上限：JPEG 按比例解码、PDF 降低渲染分辨率以满足此上限
+MAX_DECODE_BYTES = 128 * 1024 * 1024
+# 进程内所有会话同时进行的解码/渲染可占用的像素内存总量，超出时后来的请求排队等待
+DECODE_MEMORY_BUDGET = 512 * 1024 * 1024
+# 分块渲染时每块 pixmap 的大小
+RENDER_STRIP_BYTES = 16 * 1024 * 1024
+
+
+def estimate_image_bytes(size: tuple, mode: str = "RGB") -> int:
+    """
+    根据尺寸和模式估算解码后占用的内存，只需文件头信息
+    :param size: (宽, 高)
+    :param mode: PIL 模式；RGB 在 PIL 中按每像素4字节存储
+    :return: 字节数
+    """
+    bytes_per_pixel = 1 if mode in ("1", "L", "P") else 4
+    return int(size[0] * size[1] * bytes_per_pixel)
+
+
+def budget_scale(estimated_bytes: int, max_bytes: int = MAX_DECODE_BYTES) -> float:
+    """使解码结果不超过 max_bytes 的线性缩放比例，未超出时为1"""
+    if estimated_bytes <= max_bytes:
+        return 1.0
+    return math.sqrt(max_bytes / estimated_bytes)
+
+
+class MemoryBudget:
+    """进程内共享的解码内存预算：解码前按估算大小预留，完成后归还"""
+
+    def __init__(self, budget: int = DECODE_MEMORY_BUDGET):
+        self.budget = budget
+        self.in_use = 0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def reserve(self, nbytes: int):
+        """
+        预留 nbytes 直到 with 语句结束，预算不足时等待其他解码完成
+        超过总预算的请求按总预算预留，即独占执行
+        """
+        nbytes = min(nbytes, self.budget)
+        with self._condition:
+            while self.in_use + nbytes > self.budget:
+                self._condition.wait()
+            self.in_use += nbytes
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.in_use -= nbytes
+                self._condition.notify_all()
+
+
+# 进程内共享的解码预算（所有 Streamlit 会话共用）
+decode_budget = MemoryBudget()
@@ -1,41 +1,381 @@
 import os
+import threading
+import multiprocessing
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import fitz  # PyMuPDF
 from PIL import Image
 from io import BytesIO
+from typing import Iterator, Iterable, Optional, Tuple
+from modules.render_cache import RenderCache, render_cache
+from modules.memory_budget import (MAX_DECODE_BYTES, RENDER_STRIP_BYTES, budget_scale, decode_budget,
+                                   estimate_image_bytes)
+
+# 归档输出使用的分辨率
+ARCHIVAL_DPI = 300
+# 多页渲染的进程数，默认使用全部CPU核心
+PAGE_RENDER_WORKERS = os.cpu_count() or 1
+# 保持打开的PDF文档数量上限
+MAX_OPEN_DOCUMENTS = 8
+
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+# PyMuPDF 不是线程安全的（即使操作不同的文档），进程内所有 fitz 调用都在这把锁内进行；
+# 多页并行渲染依靠进程池，每个子进程各有一把
+fitz_lock = threading.RLock()
+
+
+def pixmap_to_image(pix: fitz.Pixmap) -> Image.Image:
+    """
+    直接用 pixmap 的原始像素缓冲构建 PIL 图片，省去 PNG 编码再解码
+    :param pix: fitz Pixmap对象
+    :return: PIL Image对象
+    """
+    if pix.alpha:
+        mode = "RGBA"
+    elif pix.n == 1:
+        mode = "L"
+    else:
+        mode = "RGB"
+    # samples_mv 是 pixmap 内存的只读视图，不产生中间 bytes 副本；
+    # frombytes 在调用期间把像素解包进 PIL 自己的缓冲区，之后不再依赖 pixmap 的生命周期
+    # stride 处理每行末尾可能存在的对齐填充
+    samples = pix.samples_mv if hasattr(pix, "samples_mv") else pix.samples
+    return Image.frombytes(mode, (pix.width, pix.height), samples, "raw", mode, pix.stride)
+
+
+class _DocumentEntry:
+    """已打开的文档及其引用计数"""
+    
+    def __init__(self, document: fitz.Document):
+        self.document = document
+        self.refs = 0
+        # 被淘汰时仍有使用者，等最后一个使用者释放后再关闭
+        self.evicted = False
+
+
+class DocumentCache:
+    """已打开PDF文档的 LRU 缓存，按 (路径, 修改时间, 大小) 区分，文件变化后自动打开新版本"""
+    
+    def __init__(self, max_documents: int = MAX_OPEN_DOCUMENTS):
+        self.max_documents = max_documents
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def _key(pdf_path: str) -> tuple:
+        stat = os.stat(pdf_path)
+        return os.path.abspath(pdf_path), stat.st_mtime_ns, stat.st_size
+    
+    def _acquire(self, pdf_path: str) -> _DocumentEntry:
+        key = self._key(pdf_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                entry = _DocumentEntry(fitz.open(pdf_path))
+                self._entries[key] = entry
+                self.misses += 1
+            entry.refs += 1
+            
+            while len(self._entries) > self.max_documents:
+                _, evicted = self._entries.popitem(last=False)
+                evicted.evicted = True
+                if evicted.refs == 0:
+                    evicted.document.close()
+            return entry
+    
+    def _release(self, entry: _DocumentEntry):
+        with self._lock:
+            entry.refs -= 1
+            if entry.evicted and entry.refs == 0:
+                entry.document.close()
+    
+    @contextmanager
+    def open_document(self, pdf_path: str):
+        """
+        获取打开的文档，离开 with 块后自动释放（不关闭）
+        打开和使用期间持有进程级的 fitz_lock，同一时刻只有一个线程调用 PyMuPDF
+        :param pdf_path: PDF文件路径
+        :return: fitz Document对象
+        """
+        with fitz_lock:
+            entry = self._acquire(pdf_path)
+            try:
+                yield entry.document
+            finally:
+                self._release(entry)
+    
+    def clear(self):
+        """关闭所有未在使用的文档"""
+        with fitz_lock, self._lock:
+            for entry in self._entries.values():
+                entry.evicted = True
+                if entry.refs == 0:
+                    entry.document.close()
+            self._entries.clear()
+
+
+# 进程内共享的文档缓存（渲染子进程中各自持有一份）
+document_cache = DocumentCache()
+
+
+def fit_zoom(page_rect: fitz.Rect, dpi: int = ARCHIVAL_DPI, max_width: Optional[int] = None,
+             max_height: Optional[int] = None, max_bytes: int = MAX_DECODE_BYTES) -> float:
+    """
+    根据目标尺寸和页面大小计算缩放比例
+    :param page_rect: 页面矩形（单位为点，1/72英寸）
+    :param dpi: 分辨率上限
+    :param max_width: 最大宽度（像素）
+    :param max_height: 最大高度（像素）
+    :param max_bytes: 渲染结果的内存上限（字节），海报等大幅面页面会相应降低分辨率
+    :return: 缩放比例
+    """
+    zoom = dpi / 72
+    if max_width:
+        zoom = min(zoom, max_width / page_rect.width)
+    if max_height:
+        zoom = min(zoom, max_height / page_rect.height)
+    return zoom * budget_scale(estimate_image_bytes((page_rect.width * zoom, page_rect.height * zoom)), max_bytes)
+
+
+def region_rect(page_rect: fitz.Rect, region: Optional[tuple]) -> fitz.Rect:
+    """
+    页面上的区域矩形
+    :param page_rect: 页面矩形
+    :param region: 相对页面的比例坐标 (left, top, right, bottom)，为空时为整页
+    :return: 页面坐标下的矩形
+    """
+    if not region:
+        return page_rect
+    left, top, right, bottom = region
+    return fitz.Rect(page_rect.x0 + page_rect.width * left, page_rect.y0 + page_rect.height * top,
+                     page_rect.x0 + page_rect.width * right, page_rect.y0 + page_rect.height * bottom)
+
+
+def render_page(page: fitz.Page, zoom: float, strip_bytes: int = RENDER_STRIP_BYTES,
+                clip: Optional[fitz.Rect] = None) -> Image.Image:
+    """
+    按缩放比例渲染页面；结果较大时按水平条带分块渲染并拼接，
+    同一时刻只存在一个条带大小的 pixmap，而不是整页 pixmap 与 PIL 图片各一份
+    :param page: fitz 页面
+    :param zoom: 缩放比例
+    :param strip_bytes: 每个条带 pixmap 的大小上限（字节）
+    :param clip: 只渲染页面上的这一区域，为空时渲染整页
+    :return: PIL Image对象（RGB）
+    """
+    area = clip or page.rect
+    matrix = fitz.Matrix(zoom, zoom)
+    bounds = (area * matrix).irect
+    if bounds.width * bounds.height * 3 <= strip_bytes:
+        return pixmap_to_image(page.get_pixmap(matrix=matrix, clip=clip, alpha=False))
+    
+    img = Image.new("RGB", (bounds.width, bounds.height), "white")
+    rows = max(1, strip_bytes // (bounds.width * 3))
+    for top in range(bounds.y0, bounds.y1, rows):
+        # clip 使用页面坐标（已考虑页面旋转），像素坐标除以缩放比例即可
+        strip = fitz.Rect(area.x0, top / zoom, area.x1, min(top + rows, bounds.y1) / zoom)
+        pix = page.get_pixmap(matrix=matrix, clip=strip, alpha=False)
+        img.paste(pixmap_to_image(pix), (pix.x - bounds.x0, pix.y - bounds.y0))
+    return img
+
+
+def _render_page_worker(pdf_path: str, page_num: int, dpi: int, max_width: Optional[int],
+                        max_height: Optional[int]) -> Tuple[int, str, Tuple[int, int], bytes]:
+    """
+    子进程中渲染单页：每个进程自己打开文档（fitz 文档对象不能跨进程传递），
+    并通过本进程的文档缓存在多个页面之间复用
+    返回原始像素而不是 PIL 对象，减少进程间序列化开销
+    """
+    with document_cache.open_document(pdf_path) as pdf_document:
+        page = pdf_document[page_num]
+        img = render_page(page, fit_zoom(page.rect, dpi, max_width, max_height))
+    return page_num, img.mode, img.size, img.tobytes()
+
+
+def _get_render_pool() -> ProcessPoolExecutor:
+    """进程内共享的渲染进程池，首次使用时创建"""
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            # Streamlit 在多线程中运行脚本，fork 出的子进程可能继承被占用的锁，使用 spawn 启动
+            _render_pool = ProcessPoolExecutor(max_workers=PAGE_RENDER_WORKERS,
+                                               mp_context=multiprocessing.get_context("spawn"))
+        return _render_pool
+
+
+def _discard_render_pool(pool: ProcessPoolExecutor):
+    """渲染进程异常退出（如内存不足被杀死）后进程池不能再使用：关闭并丢弃，下次使用时重新创建"""
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is pool:
+            _render_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
 
 class PDFConverter:
-    def __init__(self):
-        pass
+    def __init__(self, cache: Optional[RenderCache] = render_cache,
+                 documents: Optional[DocumentCache] = document_cache):
+        """
+        :param cache: 渲染缓存，默认使用进程内共享缓存，传入None时不缓存
+        :param documents: 打开文档缓存，默认使用进程内共享缓存，传入None时每次重新打开
+        """
+        self.cache = cache
+        self.documents = documents
+    
+    @contextmanager
+    def _open(self, pdf_path: str):
+        """打开文档，用于 with 语句；不使用文档缓存时同样在 fitz_lock 内打开和使用"""
+        if self.documents is not None:
+            with self.documents.open_document(pdf_path) as pdf_document:
+                yield pdf_document
+            return
+        with fitz_lock, fitz.open(pdf_path) as pdf_document:
+            yield pdf_document
+    
+    def fit_matrix(self, page_rect: fitz.Rect, dpi: int = ARCHIVAL_DPI, max_width: Optional[int] = None,
+                   max_height: Optional[int] = None) -> fitz.Matrix:
+        """
+        根据目标尺寸和页面大小计算渲染矩阵
+        :param page_rect: 页面矩形（单位为点，1/72英寸）
+        :param dpi: 分辨率上限
+        :param max_width: 最大宽度（像素）
+        :param max_height: 最大高度（像素）
+        :return: 缩放矩阵
+        """
+        zoom = fit_zoom(page_rect, dpi, max_width, max_height)
+        return fitz.Matrix(zoom, zoom)
     
-    def pdf_to_image(self, pdf_path: str, page_num: int = 0) -> Image.Image:
+    def pdf_to_image(self, pdf_path: str, page_num: int = 0, dpi: int = ARCHIVAL_DPI,
+                     max_width: Optional[int] = None, max_height: Optional[int] = None,
+                     region: Optional[tuple] = None) -> Image.Image:
         """
         将PDF文件转换为图片
+        指定 max_width/max_height 时直接按目标尺寸渲染（预览、信息提取），
+        不指定时按 dpi 渲染完整分辨率（归档输出）
         :param pdf_path: PDF文件路径
         :param page_num: 要转换的页码，默认为首页
-        :return: PIL Image对象
+        :param dpi: 渲染分辨率（指定目标尺寸时为上限）
+        :param max_width: 最大宽度（像素）
+        :param max_height: 最大高度（像素）
+        :param region: 只渲染页面上的这一区域（相对页面的比例坐标 (left, top, right, bottom)），
+                       区域按目标尺寸渲染，裁剪后的证书内容获得全部像素
+        :return: PIL Image对象（命中缓存时为共享对象，请勿原地修改）
         """
         try:
-            # 打开PDF文件
-            pdf_document = fitz.open(pdf_path)
+            cache_key = None
+            if self.cache is not None:
+                cache_key = RenderCache.make_key(self.cache.content_hash(pdf_path), page_num, dpi,
+                                                 max_width, max_height, region)
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    return cached
+            
+            # 打开PDF文件（复用已打开的文档）
+            with self._open(pdf_path) as pdf_document:
+                if page_num < 0 or page_num >= len(pdf_document):
+                    page_num = 0  # 默认使用首页
+                
+                # 获取指定页面
+                page = pdf_document[page_num]
+                
+                # 将页面（或区域）直接渲染到所需分辨率（受单页内存上限约束），
+                # 并在进程共享的解码预算内排队，多个会话同时渲染大页面时内存有上限
+                clip = region_rect(page.rect, region) if region else None
+                area = clip or page.rect
+                zoom = fit_zoom(area, dpi, max_width, max_height)
+                with decode_budget.reserve(estimate_image_bytes((area.width * zoom, area.height * zoom))):
+                    img = render_page(page, zoom, clip=clip)
             
-            if page_num < 0 or page_num >= len(pdf_document):
-                page_num = 0  # 默认使用首页
+            if cache_key is not None:
+                self.cache.put(cache_key, img)
             
-            # 获取指定页面
-            page = pdf_document[page_num]
+            return img
+        except Exception as e:
+            raise Exception(f"PDF转图片失败: {str(e)}")
+    
+    def iter_pages(self, pdf_path: str, pages: Optional[Iterable[int]] = None, dpi: int = ARCHIVAL_DPI,
+                   max_width: Optional[int] = None, max_height: Optional[int] = None,
+                   workers: Optional[int] = None) -> Iterator[Tuple[int, Image.Image]]:
+        """
+        渲染多个页面，按页码顺序逐页返回
+        未命中缓存的页面分发到进程池并行渲染，前面的页面完成后即可返回，不必等待全部完成
+        :param pdf_path: PDF文件路径
+        :param pages: 要渲染的页码（从0开始），默认为全部页面，超出范围的页码会被忽略
+        :param dpi: 渲染分辨率（指定目标尺寸时为上限）
+        :param max_width: 最大宽度（像素）
+        :param max_height: 最大高度（像素）
+        :param workers: 并行进程数，默认 PAGE_RENDER_WORKERS，为1时在当前进程中渲染
+        :return: (页码, PIL Image对象) 生成器
+        """
+        try:
+            num_pages = self.extract_pdf_info(pdf_path)["num_pages"]
+            if pages is None:
+                pages = range(num_pages)
+            pages = [p for p in pages if 0 <= p < num_pages]
+            workers = workers or PAGE_RENDER_WORKERS
             
-            # 将页面转换为图片
-            pix = page.get_pixmap(dpi=300, alpha=False)
+            cache_keys = {}
+            cached_images = {}
+            if self.cache is not None:
+                content_hash = self.cache.content_hash(pdf_path)
+                for page_num in pages:
+                    cache_keys[page_num] = RenderCache.make_key(content_hash, page_num, dpi, max_width, max_height)
+                    cached = self.cache.get(cache_keys[page_num])
+                    if cached is not None:
+                        cached_images[page_num] = cached
             
-            # 转换为PIL Image
-            img = Image.open(BytesIO(pix.tobytes()))
+            missing = [p for p in pages if p not in cached_images]
             
-            # 关闭PDF文件
-            pdf_document.close()
+            # 只有一页要渲染或只用一个进程时，直接在当前进程渲染，省去进程间传输
+            if workers <= 1 or len(missing) <= 1:
+                for page_num in pages:
+                    img = cached_images.get(page_num)
+                    if img is None:
+                        img = self.pdf_to_image(pdf_path, page_num, dpi, max_width, max_height)
+                    yield page_num, img
+                return
             
-            return img
+            pool = _get_render_pool()
+            futures = {}
+            try:
+                try:
+                    for page_num in missing:
+                        futures[page_num] = pool.submit(_render_page_worker, pdf_path, page_num, dpi,
+                                                        max_width, max_height)
+                except BrokenProcessPool:
+                    _discard_render_pool(pool)
+                    futures.clear()
+                
+                for page_num in pages:
+                    img = cached_images.get(page_num)
+                    if img is None and page_num in futures:
+                        try:
+                            _, mode, size, data = futures[page_num].result()
+                            img = Image.frombytes(mode, size, data)
+                            if self.cache is not None:
+                                self.cache.put(cache_keys[page_num], img)
+                        except BrokenProcessPool:
+                            # 进程池已损坏：丢弃后其余页面在当前进程渲染，之后的调用使用新的进程池
+                            _discard_render_pool(pool)
+                            futures.clear()
+                    if img is None:
+                        img = self.pdf_to_image(pdf_path, page_num, dpi, max_width, max_height)
+                    yield page_num, img
+            finally:
+                # 调用方提前停止迭代时，取消尚未开始的渲染任务
+                for future in futures.values():
+                    future.cancel()
         except Exception as e:
-            raise Exception(f"PDF转图片失败: {str(e)}")
+            raise Exception(f"PDF多页渲染失败: {str(e)}")
     
     def pdf_to_bytes(self, pdf_path: str, page_num: int = 0, image_format: str = "JPEG") -> bytes:
         """
@@ -58,18 +398,27 @@ class PDFConverter:
         :return: PDF信息字典
         """
         try:
-            pdf_document = fitz.open(pdf_path)
-            info = {
-                "num_pages": len(pdf_document),
-                "title": pdf_document.metadata.get("title", ""),
-                "author": pdf_document.metadata.get("author", ""),
-                "subject": pdf_document.metadata.get("subject", ""),
-                "creator": pdf_document.metadata.get("creator", ""),
-                "producer": pdf_document.metadata.get("producer", ""),
-                "creation_date": pdf_document.metadata.get("creationDate", ""),
-                "mod_date": pdf_document.metadata.get("modDate", "")
-            }
-            pdf_document.close()
-            return info
+            cache_key = None
+            if self.cache is not None:
+                cache_key = f"pdf_info_{self.cache.content_hash(pdf_path)}"
+                cached = self.cache.get_metadata(cache_key)
+                if cached is not None:
+                    return dict(cached)
+            
+            with self._open(pdf_path) as pdf_document:
+                info = {
+                    "num_pages": len(pdf_document),
+                    "title": pdf_document.metadata.get("title", ""),
+                    "author": pdf_document.metadata.get("author", ""),
+                    "subject": pdf_document.metadata.get("subject", ""),
+                    "creator": pdf_document.metadata.get("creator", ""),
+                    "producer": pdf_document.metadata.get("producer", ""),
+                    "creation_date": pdf_document.metadata.get("creationDate", ""),
+                    "mod_date": pdf_document.metadata.get("modDate", "")
+                }
+            
+            if cache_key is not None:
+                self.cache.put_metadata(cache_key, info)
+            return dict(info)
         except Exception as e:
             raise Exception(f"提取PDF信息失败: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,137 @@
+# modules/phash_index.py
+import os
+import sys
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from PIL import Image
+
+# 获取当前文件所在目录
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+
+# 添加父目录到Python路径
+sys.path.append(parent_dir)
+
+from modules.database import db
+
+# 设置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# dHash 边长：16×16 = 256 位。证书多为同一模板，只有姓名等少量文字不同，
+# 64 位哈希下不同学生的同模板证书与同一证书的重新拍摄/裁剪难以区分
+PHASH_SIZE = 16
+# 判定为近似重复的最大汉明距离。实测重新压缩、缩放在 0~4 位，
+# 同模板不同学生的证书在 17 位左右
+PHASH_MAX_DISTANCE = 8
+
+
+def dhash(img: Image.Image, hash_size: int = PHASH_SIZE) -> str:
+    """
+    计算差值哈希（dHash）：灰度缩小到 (hash_size+1)×hash_size 后比较水平相邻像素
+    :param img: PIL图片对象
+    :param hash_size: 哈希边长，位数为 hash_size²
+    :return: 十六进制字符串（256 位时为 64 个字符）
+    """
+    # 先用 reduce 粗略缩小，再用 BOX 缩到目标尺寸，避免在大图上做整图滤波
+    gray = img.convert("L")
+    factor = min(gray.width // (hash_size + 1), gray.height // hash_size) // 4
+    if factor > 1:
+        gray = gray.reduce(factor)
+    pixels = np.asarray(gray.resize((hash_size + 1, hash_size), Image.Resampling.BOX), dtype=np.int16)
+
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return np.packbits(bits).tobytes().hex()
+
+
+def hamming_distance(hash_a: str, hash_b: str) -> int:
+    """两个十六进制哈希之间的汉明距离"""
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count("1")
+
+
+class BKTree:
+    """BK 树：按汉明距离组织哈希，查询时利用三角不等式只访问可能命中的子树"""
+
+    def __init__(self):
+        # 节点: [哈希, 文件ID列表, {距离: 子节点}]
+        self._root = None
+        self.size = 0
+
+    def add(self, phash: str, item_id: int):
+        """加入一个哈希；相同哈希的多个文件挂在同一节点上"""
+        self.size += 1
+        if self._root is None:
+            self._root = [phash, [item_id], {}]
+            return
+
+        node = self._root
+        while True:
+            distance = hamming_distance(phash, node[0])
+            if distance == 0:
+                node[1].append(item_id)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [phash, [item_id], {}]
+                return
+            node = child
+
+    def search(self, phash: str, max_distance: int) -> List[Tuple[int, int]]:
+        """
+        查找汉明距离不超过 max_distance 的所有文件
+        :return: [(距离, 文件ID)]，按距离升序
+        """
+        if self._root is None:
+            return []
+
+        matches = []
+        stack = [self._root]
+        while stack:
+            node_hash, item_ids, children = stack.pop()
+            distance = hamming_distance(phash, node_hash)
+            if distance <= max_distance:
+                matches.extend((distance, item_id) for item_id in item_ids)
+            # 子树中所有哈希与当前节点的距离固定为 d，只有 |d - distance| <= max_distance 的子树可能命中
+            for child_distance, child in children.items():
+                if abs(child_distance - distance) <= max_distance:
+                    stack.append(child)
+
+        return sorted(matches)
+
+
+class PerceptualHashIndex:
+    """files_uploads.phash 的进程内近似查询索引，按自增ID增量同步数据库中的新记录"""
+
+    def __init__(self):
+        self._tree = BKTree()
+        self._last_id = 0
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """载入上次同步之后新增的哈希（其他进程写入的记录也会被同步）"""
+        rows = db.get_file_hashes_since(self._last_id)
+        for row in rows:
+            self._tree.add(row['phash'], row['id'])
+            self._last_id = max(self._last_id, row['id'])
+
+    def find_similar(self, phash: str, max_distance: int = PHASH_MAX_DISTANCE,
+                     exclude_ids: Optional[List[int]] = None) -> List[Dict]:
+        """
+        查找近似重复的已上传文件
+        :param phash: 待查文件的 dHash
+        :param max_distance: 最大汉明距离
+        :param exclude_ids: 排除的文件ID（如本次上传自身）
+        :return: [{'file_id': ID, 'distance': 距离}]，按距离升序
+        """
+        exclude = set(exclude_ids or [])
+        with self._lock:
+            self.refresh()
+            matches = self._tree.search(phash, max_distance)
+        return [{'file_id': file_id, 'distance': distance}
+                for distance, file_id in matches if file_id not in exclude]
+
+
+# 进程内共享的索引（Streamlit 每次重新运行脚本都会复用）
+phash_index = PerceptualHashIndex()
@@ -0,0 +1,87 @@
+# modules/preview_pyramid.py
+import os
+import logging
+import threading
+from typing import List, Optional
+from modules.pdf_converter import PDFConverter
+from modules.image_processor import ImageProcessor
+
+# 设置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 预览图边长（最长边），由大到小逐级缩小生成
+PREVIEW_SIZES = (1600, 800, 200)
+# 预览图格式和质量：WebP 在同等质量下比 JPEG 小约三成
+PREVIEW_FORMAT = "WEBP"
+PREVIEW_EXT = ".webp"
+PREVIEW_QUALITY = 80
+
+
+class PreviewPyramid:
+    """上传文件的预览图金字塔：上传时生成几种尺寸的小图，保存在原文件旁边，查看证书时直接读取"""
+
+    def __init__(self, pdf_converter: Optional[PDFConverter] = None,
+                 image_processor: Optional[ImageProcessor] = None):
+        self.pdf_converter = pdf_converter or PDFConverter()
+        self.image_processor = image_processor or ImageProcessor()
+
+    @staticmethod
+    def preview_path(file_path: str, size: int) -> str:
+        """预览图路径：原文件去掉扩展名后加尺寸，如 uploads/ab/cd/<sha256>_800.webp"""
+        return f"{os.path.splitext(file_path)[0]}_{size}{PREVIEW_EXT}"
+
+    def preview_paths(self, file_path: str) -> List[str]:
+        """原文件对应的全部预览图路径"""
+        return [self.preview_path(file_path, size) for size in PREVIEW_SIZES]
+
+    def generate(self, file_path: str, file_type: str) -> List[str]:
+        """
+        生成预览图金字塔（已存在的不再生成）；PDF 使用首页
+        只按最大尺寸解码/渲染一次，较小的尺寸由上一级缩小得到
+        :param file_path: 原文件路径
+        :param file_type: 文件类型（不含点，如 pdf、jpg）
+        :return: 预览图路径列表，由大到小
+        """
+        paths = self.preview_paths(file_path)
+        if all(os.path.exists(path) for path in paths):
+            return paths
+
+        try:
+            largest = PREVIEW_SIZES[0]
+            if file_type.lower().lstrip(".") == "pdf":
+                img = self.pdf_converter.pdf_to_image(file_path, 0, max_width=largest, max_height=largest)
+            else:
+                img = self.image_processor.load_image(file_path, largest, largest)
+            if img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+
+            for size, path in zip(PREVIEW_SIZES, paths):
+                if img.width > size or img.height > size:
+                    img = self.image_processor.resize_image(img, size, size)
+                if not os.path.exists(path):
+                    # 先写临时文件再重命名，查看页不会读到写了一半的预览图
+                    temp_path = f"{path}.{threading.get_ident()}.tmp"
+                    img.save(temp_path, format=PREVIEW_FORMAT, quality=PREVIEW_QUALITY)
+                    os.replace(temp_path, path)
+            return paths
+        except Exception as e:
+            raise Exception(f"生成预览图失败: {str(e)}")
+
+    def get(self, file_path: str, file_type: str, size: int = 800) -> str:
+        """
+        获取不小于 size 的最小预览图路径；历史文件没有预览图时当场生成
+        :param file_path: 原文件路径
+        :param file_type: 文件类型
+        :param size: 所需最长边
+        :return: 预览图路径
+        """
+        fitting = [s for s in sorted(PREVIEW_SIZES) if s >= size] or [PREVIEW_SIZES[0]]
+        path = self.preview_path(file_path, fitting[0])
+        if not os.path.exists(path):
+            self.generate(file_path, file_type)
+        return path
+
+
+# 进程内共享的预览图生成器
+preview_pyramid = PreviewPyramid()
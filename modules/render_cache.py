@@ -0,0 +1,208 @@
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Any
+from PIL import Image
+
+# 设置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 内存缓存上限（按解码后像素字节数计算）
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+# 磁盘缓存上限
+DEFAULT_DISK_BUDGET = 1024 * 1024 * 1024
+# 元数据缓存条数上限
+MAX_METADATA_ENTRIES = 512
+# 内容哈希缓存条数上限
+MAX_HASH_ENTRIES = 1024
+
+
+def image_nbytes(img: Image.Image) -> int:
+    """图片解码后占用的字节数"""
+    return img.width * img.height * len(img.getbands())
+
+
+class RenderCache:
+    """PDF 页面渲染结果缓存：内存 LRU + 磁盘目录，两级均按字节数淘汰"""
+
+    def __init__(self, cache_dir: str = "cache/renders", memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                 disk_budget: int = DEFAULT_DISK_BUDGET):
+        self.cache_dir = cache_dir
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget
+
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._metadata = OrderedDict()
+        # (路径, 修改时间, 大小) -> 内容哈希，避免每次重新读取文件
+        self._hashes = OrderedDict()
+        # 磁盘缓存索引：路径 -> 大小，按访问先后排列；首次写入时扫描一次目录建立，之后增量维护
+        self._disk_index = None
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def content_hash(self, file_path: str) -> str:
+        """文件内容的 SHA-256，文件未变化时直接返回记住的结果"""
+        stat = os.stat(file_path)
+        identity = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            cached = self._hashes.get(identity)
+            if cached:
+                self._hashes.move_to_end(identity)
+        if cached:
+            return cached
+
+        sha256 = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+
+        with self._lock:
+            self._hashes[identity] = digest
+            while len(self._hashes) > MAX_HASH_ENTRIES:
+                self._hashes.popitem(last=False)
+        return digest
+
+    @staticmethod
+    def make_key(content_hash: str, page_num: int, dpi: float, max_width: Optional[int] = None,
+                 max_height: Optional[int] = None, region: Optional[tuple] = None) -> str:
+        """缓存键：内容哈希 + 页码 + 分辨率（按目标尺寸渲染时再加上目标尺寸，只渲染区域时再加上区域）"""
+        key = f"{content_hash}_p{page_num}_d{dpi:g}"
+        if max_width or max_height:
+            key += f"_w{max_width or 0}h{max_height or 0}"
+        if region:
+            key += "_r" + "-".join(f"{v:.4f}" for v in region)
+        return key
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.png")
+
+    def get(self, key: str) -> Optional[Image.Image]:
+        """查询缓存，先查内存再查磁盘；返回的图片为共享对象，调用方不应原地修改"""
+        with self._lock:
+            img = self._memory.get(key)
+            if img is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return img
+
+        disk_path = self._disk_path(key)
+        if os.path.exists(disk_path):
+            try:
+                img = Image.open(disk_path)
+                img.load()
+                # 更新访问时间，磁盘淘汰按最久未使用进行
+                os.utime(disk_path)
+                self._put_memory(key, img)
+                with self._lock:
+                    if self._disk_index is not None and disk_path in self._disk_index:
+                        self._disk_index.move_to_end(disk_path)
+                    self.hits += 1
+                return img
+            except Exception as e:
+                logger.warning(f"读取渲染缓存失败，忽略: {disk_path}: {e}")
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, img: Image.Image):
+        """写入缓存（内存和磁盘）"""
+        self._put_memory(key, img)
+        try:
+            self._put_disk(key, img)
+        except Exception as e:
+            logger.warning(f"写入渲染缓存失败: {e}")
+
+    def _put_memory(self, key: str, img: Image.Image):
+        size = image_nbytes(img)
+        if size > self.memory_budget:
+            return
+
+        with self._lock:
+            if key in self._memory:
+                self._memory_bytes -= image_nbytes(self._memory.pop(key))
+            self._memory[key] = img
+            self._memory_bytes += size
+
+            while self._memory_bytes > self.memory_budget:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= image_nbytes(evicted)
+
+    def _put_disk(self, key: str, img: Image.Image):
+        disk_path = self._disk_path(key)
+        if os.path.exists(disk_path):
+            return
+
+        os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+        temp_path = f"{disk_path}.{threading.get_ident()}.tmp"
+        # 低压缩级别：缓存以读写速度为主
+        img.save(temp_path, format="PNG", compress_level=1)
+        os.replace(temp_path, disk_path)
+        self._add_disk_entry(disk_path, os.path.getsize(disk_path))
+
+    def _scan_disk(self) -> OrderedDict:
+        """扫描缓存目录，按访问时间由旧到新建立索引（每个进程只在首次写入时执行一次）"""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".png"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, path, stat.st_size))
+        entries.sort()
+        return OrderedDict((path, size) for _, path, size in entries)
+
+    def _add_disk_entry(self, disk_path: str, size: int):
+        """登记新写入的缓存文件，超出上限时按访问顺序淘汰最旧的文件，每次只处理被淘汰的条目"""
+        with self._lock:
+            if self._disk_index is None:
+                self._disk_index = self._scan_disk()
+                self._disk_bytes = sum(self._disk_index.values())
+            self._disk_bytes -= self._disk_index.pop(disk_path, 0)
+            self._disk_index[disk_path] = size
+            self._disk_bytes += size
+
+            evicted = []
+            while self._disk_bytes > self.disk_budget and len(self._disk_index) > 1:
+                path, evicted_size = self._disk_index.popitem(last=False)
+                self._disk_bytes -= evicted_size
+                evicted.append(path)
+
+        for path in evicted:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def get_metadata(self, key: str) -> Optional[Any]:
+        """查询元数据缓存（如PDF信息）"""
+        with self._lock:
+            value = self._metadata.get(key)
+            if value is not None:
+                self._metadata.move_to_end(key)
+            return value
+
+    def put_metadata(self, key: str, value: Any):
+        """写入元数据缓存"""
+        with self._lock:
+            self._metadata[key] = value
+            self._metadata.move_to_end(key)
+            while len(self._metadata) > MAX_METADATA_ENTRIES:
+                self._metadata.popitem(last=False)
+
+
+# 进程内共享的渲染缓存（Streamlit 每次重新运行脚本都会复用）
+render_cache = RenderCache()
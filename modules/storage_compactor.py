@@ -0,0 +1,341 @@
+# modules/storage_compactor.py
+import os
+import sys
+import json
+import time
+import shutil
+import struct
+import hashlib
+import logging
+import tempfile
+from typing import Dict, List, Optional, Set, Tuple
+import fitz  # PyMuPDF
+from PIL import Image
+from PIL.PngImagePlugin import PngInfo
+from sqlalchemy import text
+
+# 获取当前文件所在目录
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+
+# 添加父目录到Python路径
+sys.path.append(parent_dir)
+
+from modules.database import db
+from modules.file_upload import FileUploader
+from modules.preview_pyramid import PreviewPyramid, PREVIEW_EXT, PREVIEW_SIZES
+
+# 设置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 重新编码后至少节省的比例，不足时保留原文件
+COMPACT_MIN_SAVING = 0.05
+# 未被引用的文件至少存在（或被认领）这么久才删除：上传时先写文件再登记，复用已有文件时会更新修改时间
+GC_GRACE_SECONDS = 24 * 3600
+# 记录已检查过的文件，未变化时不再重复尝试
+STATE_FILE = ".compactor_state.json"
+# 删除前先把文件改名为此后缀，再确认没有被认领
+TRASH_SUFFIX = ".trash"
+# 图片 info 中描述编码方式而非图片内容的字段，重新编码时不需要保留
+ENCODING_INFO_KEYS = ("compression", "interlace")
+
+
+class StorageCompactor:
+    """
+    uploads 目录维护：无损重新压缩原文件，清理没有记录引用的文件
+    重新压缩的结果按新内容的哈希另存（内容寻址路径始终对应文件内容），记录仍保留上传时的 content_hash，
+    旧文件不在压缩时删除，由清理任务在没有引用且超过宽限期后删除
+    """
+
+    def __init__(self, upload_dir: str = "uploads", min_saving: float = COMPACT_MIN_SAVING,
+                 grace_seconds: int = GC_GRACE_SECONDS):
+        self.upload_dir = upload_dir
+        self.min_saving = min_saving
+        self.grace_seconds = grace_seconds
+        self.state_path = os.path.join(upload_dir, STATE_FILE)
+        self.uploader = FileUploader(upload_dir)
+
+    def _load_state(self) -> Dict[str, int]:
+        """已检查文件 -> 检查时的大小"""
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_state(self, state: Dict[str, int]):
+        temp_path = f"{self.state_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(temp_path, self.state_path)
+
+    @staticmethod
+    def _query(query: str, params: Optional[Dict] = None) -> List[Dict]:
+        """
+        读主库；查询失败时抛出异常，由调用方中止维护
+        （db.execute_query 失败时返回空列表，会让所有文件看起来都没有被引用）
+        """
+        with db.get_session() as session:
+            return [dict(row._mapping) for row in session.execute(text(query), params or {})]
+
+    def _stored_files(self) -> List[Dict]:
+        """被记录引用的每个物理文件（同一内容的多条记录共用一个文件）"""
+        return self._query("""
+        SELECT file_path, MIN(file_type) AS file_type, MIN(file_size) AS file_size, COUNT(*) AS refs
+        FROM files_uploads
+        GROUP BY file_path
+        """)
+
+    @staticmethod
+    def _png_metadata(img: Image.Image) -> Dict:
+        """
+        原图的元数据（色彩配置、EXIF、分辨率、透明色、伽马、sRGB、文字块）转为 PNG 保存参数
+        有 PNG 无法写入的元数据时抛出异常，保留原文件
+        """
+        info = {key: value for key, value in img.info.items() if key not in ENCODING_INFO_KEYS}
+        pnginfo = PngInfo()
+        for key, value in getattr(img, "text", {}).items():
+            pnginfo.add_text(key, value)
+            info.pop(key, None)
+        if "gamma" in info:
+            pnginfo.add(b"gAMA", struct.pack(">I", int(round(info.pop("gamma") * 100000))))
+        if "srgb" in info:
+            pnginfo.add(b"sRGB", struct.pack(">B", info.pop("srgb")))
+        
+        params = {"pnginfo": pnginfo}
+        for key in ("icc_profile", "exif", "dpi", "transparency"):
+            if key in info:
+                params[key] = info.pop(key)
+        if info:
+            raise ValueError(f"无法保留的元数据: {', '.join(map(str, info))}")
+        return params
+
+    @staticmethod
+    def _comparable_info(img: Image.Image) -> Dict:
+        """用于核对的元数据；BMP/PNG 都按每米像素数存分辨率，换算成 dpi 的舍入方式不同，按每米像素数比较"""
+        info = {key: value for key, value in img.info.items() if key not in ENCODING_INFO_KEYS}
+        if "dpi" in info:
+            info["dpi"] = tuple(round(value / 0.0254) for value in info["dpi"])
+        return info
+
+    @staticmethod
+    def _recompress_image(file_path: str, temp_path: str) -> str:
+        """
+        BMP/PNG 无损重新编码为优化的 PNG，保留元数据，并逐像素、逐项元数据核对
+        :return: 新文件的类型
+        """
+        with Image.open(file_path) as img:
+            img.load()
+            img.save(temp_path, format="PNG", optimize=True, **StorageCompactor._png_metadata(img))
+            with Image.open(temp_path) as result:
+                if result.mode != img.mode or result.size != img.size or result.tobytes() != img.tobytes():
+                    raise ValueError("重新编码后像素不一致")
+                if StorageCompactor._comparable_info(result) != StorageCompactor._comparable_info(img):
+                    raise ValueError("重新编码后元数据不一致")
+        return "png"
+
+    @staticmethod
+    def _recompress_pdf(file_path: str, temp_path: str) -> str:
+        """
+        清理 PDF：删除未使用对象、合并重复对象、压缩未压缩的流，不改写页面内容流
+        :return: 新文件的类型
+        """
+        with fitz.open(file_path) as doc:
+            page_count = doc.page_count
+            doc.save(temp_path, garbage=4, deflate=True)
+        with fitz.open(temp_path) as result:
+            if result.page_count != page_count:
+                raise ValueError("清理后页数不一致")
+        return "pdf"
+
+    @staticmethod
+    def _file_hash(file_path: str) -> str:
+        sha256 = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+    @staticmethod
+    def _carry_previews(old_path: str, new_path: str):
+        """新文件沿用旧文件的预览图（硬链接，不支持时复制），查看证书时不必重新生成"""
+        for size in PREVIEW_SIZES:
+            old_preview = PreviewPyramid.preview_path(old_path, size)
+            new_preview = PreviewPyramid.preview_path(new_path, size)
+            if not os.path.exists(old_preview) or os.path.exists(new_preview):
+                continue
+            try:
+                os.link(old_preview, new_preview)
+            except OSError:
+                shutil.copyfile(old_preview, new_preview)
+
+    def compact_file(self, file_path: str, file_type: str) -> Tuple[int, str]:
+        """
+        重新压缩一个原文件；明显更小时按新内容的哈希另存，并把引用旧文件的记录指向新文件
+        旧文件保留，没有记录引用后由 collect_garbage 删除
+        :param file_path: 原文件路径
+        :param file_type: 文件类型
+        :return: (节省的字节数, 处理后的文件路径)，未替换时为 (0, 原路径)
+        """
+        file_type = file_type.lower()
+        if file_type in ("bmp", "png"):
+            recompress = self._recompress_image
+        elif file_type == "pdf":
+            recompress = self._recompress_pdf
+        else:
+            # JPEG 等有损格式重新编码会损失画质，不处理
+            return 0, file_path
+
+        os.makedirs(self.uploader.incoming_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.uploader.incoming_dir, suffix=".tmp")
+        os.close(fd)
+        old_size = os.path.getsize(file_path)
+        try:
+            new_type = recompress(file_path, temp_path)
+            new_size = os.path.getsize(temp_path)
+            if new_size > old_size * (1 - self.min_saving):
+                os.remove(temp_path)
+                return 0, file_path
+
+            # 新内容有自己的内容寻址路径；已存在（之前压缩过同一文件）时直接复用
+            new_path = self.uploader.content_path(self._file_hash(temp_path), new_type)
+            if self.uploader.claim(new_path):
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(new_path), exist_ok=True)
+                os.replace(temp_path, new_path)
+            self._carry_previews(file_path, new_path)
+
+            updated = db.execute_update(
+                "UPDATE files_uploads SET file_path = :new_path, file_type = :file_type, file_size = :file_size "
+                "WHERE file_path = :old_path",
+                {'new_path': new_path, 'file_type': new_type, 'file_size': new_size, 'old_path': file_path}
+            )
+            if not updated:
+                # 记录没有更新时新文件无人引用，宽限期后由清理任务删除
+                return 0, file_path
+
+            logger.info(f"已重新压缩 {file_path} -> {new_path}: {old_size} -> {new_size} 字节")
+            return old_size - new_size, new_path
+        except Exception as e:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            logger.warning(f"重新压缩失败，保留原文件: {file_path}: {e}")
+            return 0, file_path
+
+    def compact(self) -> Dict:
+        """重新压缩所有可无损压缩的原文件，返回处理数量和压缩后减少的字节数"""
+        state = self._load_state()
+        compacted = 0
+        saved = 0
+
+        for row in self._stored_files():
+            file_path = row['file_path']
+            if not os.path.exists(file_path):
+                continue
+            size = os.path.getsize(file_path)
+            if state.get(file_path) == size:
+                continue
+
+            file_saved, file_path = self.compact_file(file_path, row['file_type'])
+            if file_saved:
+                compacted += 1
+                saved += file_saved
+            state[file_path] = os.path.getsize(file_path)
+
+        self._save_state(state)
+        return {'compacted': compacted, 'bytes_saved': saved}
+
+    def _referenced_paths(self) -> Set[str]:
+        """
+        被记录引用的原文件及其预览图（绝对路径）
+        files_uploads 有记录却一个引用都没查到时视为查询异常，抛出异常中止清理
+        """
+        referenced = set()
+        for row in self._stored_files():
+            file_path = os.path.abspath(row['file_path'])
+            referenced.add(file_path)
+            base = os.path.splitext(file_path)[0]
+            referenced.update(f"{base}_{size}{PREVIEW_EXT}" for size in PREVIEW_SIZES)
+
+        if not referenced and self._query("SELECT COUNT(*) AS count FROM files_uploads")[0]['count'] > 0:
+            raise RuntimeError("files_uploads 有记录但未查到任何引用的文件")
+        return referenced
+
+    def _remove_unreferenced(self, path: str, now: float) -> bool:
+        """
+        删除一个原文件前再次确认：先改名使其不能再被认领，再检查修改时间和引用数，
+        期间被认领（修改时间更新）或已被记录引用时改回原名（内容寻址，即使上传方已重新写入，内容也相同）
+        :return: 是否已删除
+        """
+        trash_path = path + TRASH_SUFFIX
+        try:
+            os.replace(path, trash_path)
+        except FileNotFoundError:
+            return False
+        try:
+            claimed = now - os.stat(trash_path).st_mtime < self.grace_seconds
+            if claimed or db.count_file_references(os.path.relpath(path)) > 0:
+                os.replace(trash_path, path)
+                return False
+        except Exception:
+            os.replace(trash_path, path)
+            raise
+        os.remove(trash_path)
+        return True
+
+    def collect_garbage(self, now: Optional[float] = None) -> Dict:
+        """
+        删除没有任何 files_uploads 记录引用、且超过宽限期的文件（含预览图和中断的临时文件）
+        引用查询失败时抛出异常，不删除任何文件
+        """
+        now = now or time.time()
+        referenced = self._referenced_paths()
+        removed = 0
+        reclaimed = 0
+
+        for root, _, files in os.walk(self.upload_dir):
+            for name in files:
+                path = os.path.abspath(os.path.join(root, name))
+                if name == STATE_FILE or path in referenced:
+                    continue
+                try:
+                    stat = os.stat(path)
+                    if now - stat.st_mtime < self.grace_seconds:
+                        continue
+                    # 预览图、临时文件可随时重新生成，直接删除；原文件删除前再次确认
+                    if name.endswith(PREVIEW_EXT) or name.endswith((".tmp", TRASH_SUFFIX)):
+                        os.remove(path)
+                    elif not self._remove_unreferenced(path, now):
+                        continue
+                except FileNotFoundError:
+                    continue
+                removed += 1
+                reclaimed += stat.st_size
+                logger.info(f"已删除未引用的文件: {path}")
+
+        return {'removed': removed, 'bytes_reclaimed': reclaimed}
+
+    def run(self) -> Dict:
+        """执行一次完整的维护：重新压缩，然后清理未引用的文件（被替换的旧文件在这里删除）"""
+        compaction = self.compact()
+        garbage = self.collect_garbage()
+        return {
+            'compacted': compaction['compacted'],
+            # 重新压缩后比原文件小的字节数
+            'bytes_saved': compaction['bytes_saved'],
+            'removed': garbage['removed'],
+            # 清理实际释放的磁盘空间
+            'bytes_reclaimed': garbage['bytes_reclaimed']
+        }
+
+
+if __name__ == "__main__":
+    # 建议在访问量低的时段通过 cron 每天执行一次：python modules/storage_compactor.py
+    try:
+        summary = StorageCompactor().run()
+        logger.info(f"上传文件存储维护完成: {summary}")
+    except Exception as e:
+        logger.error(f"上传文件存储维护中止: {e}")
+        sys.exit(1)
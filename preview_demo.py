@@ -57,7 +57,7 @@ def main():
                     st.write(f"页数: {pdf_info['num_pages']}")
                     
                     # 转换PDF为图片
-                    img = pdf_converter.pdf_to_image(temp_path)
+                    img = pdf_converter.pdf_to_image(temp_path, max_width=2000, max_height=2000)
                     
                     # 预览转换后的图片
                     st.image(img, caption="PDF转换后的图片", use_column_width=True)